@@ -12,9 +12,14 @@ from discord.ext import commands
 from discord.ext.commands import Cog, parameter
 from tqdm import tqdm
 
-from topping_bot.optimize.optimize import Optimizer
+from topping_bot.optimize.beam import BeamOptimizer
+from topping_bot.optimize.cache import SOLVE_CACHE
+from topping_bot.optimize.engines import ENGINES
 from topping_bot.optimize.reader import read_toppings, write_toppings
 from topping_bot.optimize.requirements import Requirements
+from topping_bot.optimize.stats import stats_path
+from topping_bot.optimize.team import TeamOptimizer
+from topping_bot.optimize.toppings import ToppingSet
 from topping_bot.util.common import (
     admin_only,
     approved_guild_ctx,
@@ -27,12 +32,21 @@ from topping_bot.util.common import (
     send_msg,
 )
 from topping_bot.util.const import CONFIG, DATA_PATH
-from topping_bot.util.cpu import optimize_cookie
+from topping_bot.util.cpu import optimize_cookie, optimize_team, read_published
 from topping_bot.util.image import topping_set_to_image
-from topping_bot.util.parallel import RUNNING_CPU_TASK, SEMAPHORE
-from topping_bot.ui.common import RemoveToppingsMenu, RequirementConfirm, RequirementView, SaveView, ThreadSave
+from topping_bot.util.parallel import FAST_SEMAPHORE, RUNNING_CPU_TASK, SEMAPHORE
+from topping_bot.ui.common import (
+    AcceptBest,
+    RemoveToppingsMenu,
+    RequirementConfirm,
+    RequirementView,
+    SaveView,
+    ThreadSave,
+)
 from topping_bot.util.utility import leaderboard_path
 
+OPTIMIZE_MODES = ("--fast", "--team")
+
 
 class Cookies(Cog, description="Optimize your cookies' toppings"):
     def __init__(self, bot):
@@ -66,7 +80,29 @@ class Cookies(Cog, description="Optimize your cookies' toppings"):
         description="Optimize toppings given a requirements file",
         invoke_without_command=True,
     )
-    async def optimize(self, ctx, target=parameter(description="who to optimize for", default=None)):
+    async def optimize(
+        self,
+        ctx,
+        target=parameter(description="who to optimize for", default=None),
+        mode=parameter(description="--fast for a quick approximate solve, --team to share toppings", default=None),
+    ):
+        if target in OPTIMIZE_MODES:
+            target, mode = mode, target
+        unknown = mode if mode is not None and mode not in OPTIMIZE_MODES else None
+        if unknown or (target and target.startswith("--")):  # a single mode, after the member if any
+            await send_msg(
+                ctx,
+                title="Err: Unknown Mode",
+                description=[
+                    f"{unknown or target} is not an !optimize mode",
+                    "",
+                    "Usage: !optimize [member] [--fast | --team]",
+                ],
+            )
+            return
+        fast = mode == "--fast"
+        team = mode == "--team"
+
         if target and not moderator_only(ctx):
             return
         if target and (target := await find_member(ctx, target)) is None:
@@ -156,7 +192,8 @@ class Cookies(Cog, description="Optimize your cookies' toppings"):
             return
 
         msg = None
-        if SEMAPHORE.locked():
+        semaphore = FAST_SEMAPHORE if fast else SEMAPHORE
+        if semaphore.locked():
             tqdm.write(f"{datetime.now().isoformat(sep=' ', timespec='seconds')} : {user} queued !optimize")
             msg = await send_msg(
                 ctx,
@@ -169,7 +206,7 @@ class Cookies(Cog, description="Optimize your cookies' toppings"):
             )
 
         RUNNING_CPU_TASK[user.id] = None
-        async with SEMAPHORE:
+        async with semaphore:
             tqdm.write(f"{datetime.now().isoformat(sep=' ', timespec='seconds')} : {user} began !optimize")
 
             if msg is None:
@@ -201,7 +238,75 @@ class Cookies(Cog, description="Optimize your cookies' toppings"):
 
             results = {}
             cancelled = False
-            optimizer = Optimizer(toppings)
+            early = False  # a streamed incumbent was accepted before the solve proved it best
+            if fast:
+                optimizer = BeamOptimizer(toppings, width=CONFIG["optimizer"].get("beam-width", 32))
+            else:
+                optimizer = ENGINES[CONFIG["optimizer"].get("engine", "decimal")](toppings)
+
+            stats_fp = None
+            if CONFIG["optimizer"].get("profile"):  # keep the search stats of the latest run only
+                stats_fp = stats_path(user.id)
+                stats_fp.unlink(missing_ok=True)
+
+            team_sets = {}
+            if team and len(toppings) >= 5:
+                progress = await send_msg(ctx, title=f"Solving {name} Team ...", thread=thread)
+
+                allocation = Array("i", [-1] * (5 * len(cookies)), lock=False)
+                shared_memory = SharedMemory(create=True, size=64)
+                process = Process(
+                    target=optimize_team,
+                    args=(
+                        TeamOptimizer(toppings, depth=CONFIG["optimizer"].get("team-depth", 16)),
+                        cookies,
+                        shared_memory.name,
+                        allocation,
+                    ),
+                )
+                RUNNING_CPU_TASK[user.id] = process
+
+                old_desc = ""
+                start_time = datetime.now()
+                process.start()
+                while process.is_alive():
+                    desc = bytes(shared_memory.buf[:]).decode(encoding="utf-8", errors="ignore").rstrip("\x00")
+                    if old_desc != desc and shared_memory.buf[-1] != 1:
+                        await edit_msg(progress, title=f"Solving {name} Team ...", description=desc)
+                        old_desc = desc
+                    elif shared_memory.buf[-1] == 1:
+                        await edit_msg(progress, title=f"Solving {name} Team Stopping", description="Stopping...")
+
+                    await asyncio.sleep(2)
+
+                    if not cancelled and start_time + timedelta(minutes=20) < datetime.now():
+                        shared_memory.buf[-1] = 1
+                        cancelled = True
+                    if cancelled and start_time + timedelta(minutes=22) < datetime.now():
+                        process.terminate()
+
+                shared_memory.close()
+                shared_memory.unlink()
+                await progress.delete()
+
+                if process.exitcode != 0:
+                    await send_msg(
+                        ctx,
+                        title="Err: Solve Forcibly Stopped",
+                        description=[
+                            "The team solve was forcibly stopped either by extended timeout or !stop",
+                            "",
+                            "If this is unexpected, please optimize your requirements or contact the admin",
+                        ],
+                        footer=f"admin: @{(await ctx.bot.application_info()).owner}",
+                        thread=thread,
+                    )
+                    RUNNING_CPU_TASK.pop(user.id, None)
+                    return
+
+                for k, cookie in enumerate(cookies):  # cookies left out of the team are solved one by one
+                    if allocation[5 * k] != -1:
+                        team_sets[cookie.name] = [toppings[i] for i in allocation[5 * k : 5 * k + 5]]
 
             for cookie in cookies:
                 if len(optimizer.inventory) < 5:
@@ -234,38 +339,76 @@ class Cookies(Cog, description="Optimize your cookies' toppings"):
 
                 progress = await send_msg(ctx, title=f"Solving {cookie.name} ...", thread=thread)
 
-                solution = Array("i", 5)
-                shared_memory = SharedMemory(create=True, size=64)
-                process = Process(target=optimize_cookie, args=(optimizer, cookie, shared_memory.name, solution))
-                RUNNING_CPU_TASK[user.id] = process
-
-                old_desc = ""
-                start_time = datetime.now()
-                process.start()
-                while process.is_alive():
-                    desc = bytes(shared_memory.buf[:]).decode(encoding="utf-8", errors="ignore").rstrip("\x00")
-                    if old_desc != desc and shared_memory.buf[-1] != 1:
-                        await edit_msg(progress, title=f"Solving {cookie.name} ...", description=desc)
-                        old_desc = desc
-                    elif shared_memory.buf[-1] == 1:
-                        await edit_msg(progress, title=f"Solving {cookie.name} Stopping", description="Stopping...")
-
-                    await asyncio.sleep(2)
-
-                    if not cancelled and start_time + timedelta(minutes=20) < datetime.now():
-                        cancel_memory = SharedMemory(name=shared_memory.name)
-                        cancel_memory.buf[-1] = 1
-                        cancelled = True
-
-                    if cancelled and start_time + timedelta(minutes=22) < datetime.now():
-                        process.terminate()
-
-                shared_memory.close()
-                shared_memory.unlink()
+                solution = Array("i", 5, lock=False)
+                best = Array("d", [0, float("-inf")], lock=False)
+                accepted = False
+                cached = None if team else SOLVE_CACHE.get(optimizer.inventory, cookie)
+                if (team_set := team_sets.get(cookie.name)) is not None:
+                    solution[:] = [next(i for i, t in enumerate(optimizer.inventory) if t is x) for x in team_set]
+                    exitcode = 0
+                elif cached is not None:
+                    solution[:] = cached or [0] * 5
+                    await edit_msg(progress, title=f"Solving {cookie.name} ...", description="Cache hit")
+                    exitcode = 0
+                else:
+                    shared_memory = SharedMemory(create=True, size=64)
+                    seed = None if fast else SOLVE_CACHE.seed(optimizer.inventory, cookie)
+                    process = Process(
+                        target=optimize_cookie,
+                        args=(optimizer, cookie, shared_memory.name, solution, best, seed, stats_fp),
+                    )
+                    accept = AcceptBest(ctx)
+                    RUNNING_CPU_TASK[user.id] = process
+
+                    old_desc, old_live = "", None
+                    start_time = datetime.now()
+                    process.start()
+                    while process.is_alive():
+                        desc = bytes(shared_memory.buf[:]).decode(encoding="utf-8", errors="ignore").rstrip("\x00")
+                        live = read_published(solution, best) or old_live
+                        if (old_desc != desc or old_live != live) and shared_memory.buf[-1] != 1:
+                            description = [desc]
+                            if live is not None:  # render the streamed incumbent so it can be accepted early
+                                current = ToppingSet([optimizer.inventory[i] for i in live[0]])
+                                description += ["", "Current Best"] + [
+                                    f"├ {substat.value} : {value:.1f}"
+                                    for substat, value in cookie.objective.fancy_value(current).items()
+                                ]
+                            await edit_msg(progress, title=f"Solving {cookie.name} ...", description=description)
+                            if live is not None and old_live is None:
+                                await progress.edit(view=accept)
+                            old_desc, old_live = desc, live
+                        elif shared_memory.buf[-1] == 1:
+                            await edit_msg(progress, title=f"Solving {cookie.name} Stopping", description="Stopping...")
+
+                        await asyncio.sleep(2)
+
+                        if accept.result and not accepted:
+                            shared_memory.buf[-1] = 1
+                            accepted = early = True
+
+                        if not cancelled and start_time + timedelta(minutes=20) < datetime.now():
+                            cancel_memory = SharedMemory(name=shared_memory.name)
+                            cancel_memory.buf[-1] = 1
+                            cancelled = True
+
+                        if cancelled and start_time + timedelta(minutes=22) < datetime.now():
+                            process.terminate()
+
+                    stopped = shared_memory.buf[-1] == 1
+                    shared_memory.close()
+                    shared_memory.unlink()
+
+                    accept.stop()
+                    exitcode = process.exitcode
+                    if exitcode != 0 and read_published(solution, best) is not None:
+                        exitcode, cancelled = 0, True  # forcibly stopped, fall back on the last streamed incumbent
+                    elif exitcode == 0 and not stopped and not fast and not team:
+                        SOLVE_CACHE.put(optimizer.inventory, cookie, solution[:] if any(solution[:]) else [])
 
                 await progress.delete()
 
-                if process.exitcode != 0:
+                if exitcode != 0:
                     await send_msg(
                         ctx,
                         title="Err: Solve Forcibly Stopped",
@@ -279,6 +422,19 @@ class Cookies(Cog, description="Optimize your cookies' toppings"):
                     )
                     RUNNING_CPU_TASK.pop(user.id, None)
                     return
+                elif not any(solution[:]) and fast and cached is None:
+                    await send_msg(
+                        ctx,
+                        title="Err: No Fast Solution Found",
+                        description=[
+                            "The fast solve found no valid topping set, one may still exist",
+                            "",
+                            "Please use !optimize without --fast for the exact solve",
+                        ],
+                        thread=thread,
+                    )
+                    RUNNING_CPU_TASK.pop(user.id, None)
+                    return
                 elif not any(solution[:]):
                     await send_msg(
                         ctx,
@@ -295,21 +451,31 @@ class Cookies(Cog, description="Optimize your cookies' toppings"):
 
                 optimizer.set_solution(solution)
                 optimizer.reqs = cookie
+                gap = optimizer.gap() if fast and cached is None else None
                 optimizer.select(cookie.name)
 
                 cookie_img = topping_set_to_image(optimizer.solution, ctx.message.author.id, name=cookie.name)
 
                 name = "".join(char for char in cookie.name if char.isalnum())
                 image = discord.File(cookie_img, filename=f"{name}.png")
-                title = (
-                    f"__**{cookie.name} Topping Set**__"
-                    if not cancelled
-                    else f"__**{cookie.name} STOPPED Topping Set**__"
-                )
+                if cancelled:
+                    title = f"__**{cookie.name} STOPPED Topping Set**__"
+                elif accepted:
+                    title = f"__**{cookie.name} Accepted Topping Set**__"
+                elif team_set is not None:
+                    title = f"__**{cookie.name} Team Topping Set**__"
+                elif cached is not None:
+                    title = f"__**{cookie.name} Topping Set (cached)**__"
+                elif fast:
+                    title = f"__**{cookie.name} Fast Topping Set**__"
+                else:
+                    title = f"__**{cookie.name} Topping Set**__"
                 footer = "  |  ".join(
                     f"{substat.value} : {value:.1f}"
                     for substat, value in optimizer.reqs.objective.fancy_value(optimizer.solution).items()
                 )
+                if gap is not None:
+                    footer += f"  |  within {gap:.1f}% of optimal, run !optimize for the exact set"
                 embed = await new_embed(
                     title=title,
                     image=f"attachment://{name}.png",
@@ -322,14 +488,14 @@ class Cookies(Cog, description="Optimize your cookies' toppings"):
                 else:
                     await ctx.reply(embed=embed, file=image)
 
-                if cancelled:
+                if cancelled and team_set is None:  # a stopped team solve still hands out its best team
                     break
 
                 results[name] = str(optimizer.reqs.objective.value(optimizer.solution))
 
             RUNNING_CPU_TASK.pop(user.id, None)
 
-            if is_default and not cancelled:
+            if is_default and not cancelled and not early and not fast and not team:
                 leaderboard_fp = leaderboard_path(requirements_fp)
 
                 if leaderboard_fp.exists():
@@ -460,6 +626,29 @@ class Cookies(Cog, description="Optimize your cookies' toppings"):
                 process.terminate()
             RUNNING_CPU_TASK.clear()
 
+    @commands.command(checks=[admin_only], brief="Solve stats", description="Search stats of the latest optimize run")
+    async def solvestats(self, ctx, target=parameter(description="whose stats to view", default=None)):
+        if target and (target := await find_member(ctx, target)) is None:
+            return
+
+        target = target or ctx.message.author
+        stats_fp = stats_path(target.id)
+        if not stats_fp.exists():
+            await send_msg(
+                ctx,
+                title="Err: No Solve Stats",
+                description=[
+                    "No stats were recorded for their latest optimize run",
+                    "Set profile in the optimizer config to record them",
+                ],
+            )
+            return
+
+        await ctx.channel.send(
+            embed=await new_embed(title="Solve Stats", description="Attached are the search stats per cookie"),
+            file=discord.File(stats_fp, filename=stats_fp.name),
+        )
+
     @commands.command(checks=[admin_only], brief="Snapshot", description="Snapshot", aliases=["snap"])
     async def snapshot(self, ctx, target=parameter(description="who to snapshot", default=None)):
         if target and (target := await find_member(ctx, target)) is None:
@@ -11,7 +11,7 @@ import pyparsing as pp
 from tqdm import tqdm
 
 from topping_bot.optimize.inventory import Inventory as ToppingInventory
-from topping_bot.optimize.reader import write_toppings
+from topping_bot.optimize.reader import remove_toppings, write_toppings
 from topping_bot.util.common import (
     admin_only,
     approved_guild_only,
@@ -362,7 +362,7 @@ class Inventory(Cog, description="View and update your topping inventory"):
             inventory = inventory.filter(f"not ({query})")
             write_toppings((t for _, t in inventory.toppings), topping_fp)
         else:
-            topping_fp.unlink(missing_ok=True)
+            remove_toppings(topping_fp)
 
     @inv.command(aliases=["h"], brief="Learn inv", description="Learn about how inv filters work")
     async def help(self, ctx):
@@ -0,0 +1,140 @@
+from heapq import nlargest
+from typing import List
+
+from topping_bot.optimize.cutter import Prune
+from topping_bot.optimize.objectives import Special
+from topping_bot.optimize.optimize import Optimizer
+from topping_bot.optimize.requirements import Requirements
+from topping_bot.optimize.toppings import INFO, Topping, ToppingSet, Type
+
+CHECK_FACTOR = 8  # children checked for feasibility per beam slot
+
+
+class BeamOptimizer(Optimizer):
+    """
+    Heuristic optimizer running a bounded beam search over the presorted candidates
+
+    Partial sets are ranked by their objective substats, set bonuses included, and only those the dfs prune still finds
+    feasible are kept, falling back on floor coverage when too few are. The best set of the final beam is returned, it is not guaranteed optimal so the gap to the root
+    upper bound is reported alongside it
+    """
+
+    def __init__(self, toppings: List[Topping], width: int = 32):
+        super().__init__(toppings)
+        self.width = width
+        self.tracked = []
+        self.vectors = []
+        self.flavors = []
+        self.bonuses = []
+        self.floors = []
+        self.ceilings = []
+        self.objective = []
+
+    def solve(self, reqs: Requirements, seed: List[Topping] = None):
+        """Solves a cookies needed toppings given a set of requirements, yields once per first topping expanded"""
+        self.reqs = reqs
+        self.reqs.realize(self.cookies)
+
+        self.solution = None
+        self.toppings = self.candidates()
+        self.prepare()
+
+        beam = [((), [0.0] * len(self.tracked), [0] * len(self.tracked))]
+        for _ in range(5):
+            children = []
+            for combo, sums, counts in beam:
+                for i in range(combo[-1] + 1 if combo else 0, len(self.toppings)):
+                    if not combo:
+                        yield self.toppings[i]
+
+                    child_sums = [a + b for a, b in zip(sums, self.vectors[i])]
+                    child_counts = counts.copy()
+                    if (k := self.flavors[i]) is not None:
+                        child_counts[k] += 1
+
+                    if (score := self.score(child_sums, child_counts)) is not None:
+                        children.append((score, combo + (i,), child_sums, child_counts))
+
+            beam = self.select_beam(children)
+
+        for combo, _, _ in beam:
+            if (candidate := self.best_objective(ToppingSet([self.toppings[i] for i in combo]))) is not self.solution:
+                self.set_incumbent(candidate)
+
+    def select_beam(self, children: list):
+        """
+        Best scoring children that can still meet every requirement, checked with the dfs prune
+
+        Children are taken by objective first, when too few of those are feasible the rest of the beam is filled by
+        floor coverage instead
+        """
+        beam, seen = [], set()
+        for k in range(2):
+            ranked = sorted(children, key=lambda x: x[0][k], reverse=True)
+            for score, combo, sums, counts in ranked[: self.width * CHECK_FACTOR]:
+                if len(beam) == self.width:
+                    return beam
+                if combo in seen:
+                    continue
+
+                seen.add(combo)
+                if self.prune([self.toppings[i] for i in combo], self.toppings[combo[-1] + 1 :])[0] == Prune.NONE:
+                    beam.append((combo, sums, counts))
+        return beam
+
+    def prepare(self):
+        """Float substat vectors and set bonus tables of every candidate over the requirement substats"""
+        floors = [(r.substat, r.target) for r in self.reqs.floor_reqs()]
+        ceilings = [(r.substat, r.target) for r in self.reqs.ceiling_reqs()]
+        self.tracked = list(dict.fromkeys([s for s, _ in floors + ceilings] + list(self.reqs.objective.types)))
+        position = {substat: k for k, substat in enumerate(self.tracked)}
+
+        self.vectors = [[float(t.value(s)) for s in self.tracked] for t in self.toppings]
+        self.flavors = [position.get(t.flavor) for t in self.toppings]
+        self.bonuses = [[float(self.bonus(s, count)) for count in range(6)] for s in self.tracked]
+        self.floors = [(position[s], float(target)) for s, target in floors if target > 0]
+        self.ceilings = [(position[s], float(target)) for s, target in ceilings]
+        self.objective = [position[s] for s in self.reqs.objective.types]
+
+    @staticmethod
+    def bonus(substat: Type, count: int):
+        """Set bonus of substat with count toppings of its flavor"""
+        for required_count, set_bonus in INFO[substat]["combos"][::-1]:
+            if count >= required_count:
+                return set_bonus
+        return 0
+
+    def score(self, sums: List[float], counts: List[int]):
+        """Objective substats and floor coverage of a partial set, None once a ceiling is broken"""
+        values = [total + bonus[count] for total, bonus, count in zip(sums, self.bonuses, counts)]
+        if any(values[k] > target + 1e-6 for k, target in self.ceilings):
+            return None
+
+        covered = sum(min(values[k] / target, 1.0) for k, target in self.floors)
+        return sum(values[k] for k in self.objective), covered
+
+    def upper_bound(self):
+        """Root level bound on the objective, from the same pools combined_obj_case and special_case draw on"""
+        toppings = self.candidates()
+        types = self.reqs.objective.types
+
+        full_set = self.combined_case([], toppings, types)
+        if full_set is None:
+            return None
+
+        if isinstance(self.reqs.objective, Special):
+            objective = self.reqs.objective
+            uppers = [
+                objective.special_upper(pool, lows, highs)
+                for lows, highs, pool, _ in self.special_case([], toppings, {}, 0)
+            ]
+            return max((upper for upper in uppers if upper is not None), default=None)
+        return self.combined_value([], toppings, types)
+
+    def gap(self):
+        """Percent the current solution may fall short of the optimum, None without a solution or finite bound"""
+        if self.solution is None or not (upper := self.upper_bound()) or not upper.is_finite():
+            return None
+
+        value = self.reqs.objective.value(self.solution)
+        return max((upper - value) / upper * 100, 0)
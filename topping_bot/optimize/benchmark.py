@@ -0,0 +1,215 @@
+import json
+import random
+from itertools import combinations
+from decimal import Decimal
+from multiprocessing import Process
+from multiprocessing.sharedctypes import Array
+from multiprocessing.shared_memory import SharedMemory
+from pathlib import Path
+from time import perf_counter
+from typing import Dict, List
+
+from topping_bot.optimize.engines import ENGINES
+from topping_bot.optimize.memo import solve_scope
+from topping_bot.optimize.parallel import POLL_INTERVAL
+from topping_bot.optimize.requirements import Requirements
+from topping_bot.optimize.toppings import INFO, Resonance, Topping, ToppingSet
+from topping_bot.util.const import STATIC_PATH
+from topping_bot.util.cpu import optimize_cookie
+
+BENCH_PATH = STATIC_PATH / "bench"
+BASELINE_FP = BENCH_PATH / "baseline.json"
+SIZES = (100, 300, 600, 1000)
+EXACT_SIZE = 30  # toppings of the inventories small enough to search exhaustively
+EXACT_SEEDS = range(12)
+RESONANT_SHARE = 0.15  # toppings rolled with a resonance other than normal
+SLOWDOWN = 1.5  # wall time over the baseline reported as a regression
+NOISE = 0.25  # seconds of wall time jitter never reported
+CANCEL_AFTER = 1  # seconds a solve runs before its cancel byte is set
+CANCEL_GRACE = 1  # seconds past a poll interval a cancelled solve may take to exit
+
+
+def synthetic_inventory(n: int, seed: int = 0) -> List[Topping]:
+    """Reproducible inventory of n maxed toppings, substats rolled uniformly within their in-game range"""
+    rng = random.Random(seed)
+    flavors = list(INFO)
+    resonances = [resonance for resonance in Resonance if resonance != Resonance.NORMAL]
+
+    toppings = []
+    for i in range(n):
+        flavor = rng.choice(flavors)
+        substats = [(flavor.value, str(INFO[flavor]["value"]))]
+        for substat in rng.sample(flavors, 3):
+            low, high = int(INFO[substat]["minsub"] * 10), int(INFO[substat]["maxsub"] * 10)
+            substats.append((substat.value, str(Decimal(rng.randint(low, high)) / 10)))
+        resonance = rng.choice(resonances) if rng.random() < RESONANT_SHARE else Resonance.NORMAL
+        toppings.append(Topping(substats, resonance=resonance, index=i))
+    return toppings
+
+
+def run_file(engine: str, fp: Path, toppings: List[Topping]) -> Dict[str, dict]:
+    """Solves the cookies of a requirements file in order like !optimize, measuring every solve"""
+    optimizer = ENGINES[engine](toppings)
+    nodes = 0
+    if optimizer.profiled:
+        prune = optimizer.prune
+
+        def counted_prune(*args):
+            nonlocal nodes
+            nodes += 1
+            return prune(*args)
+
+        optimizer.prune = counted_prune
+
+    results = {}
+    for cookie in Requirements.from_yaml(fp):
+        nodes, start = 0, perf_counter()
+        with solve_scope(cookie.name):
+            for _ in optimizer.solve(cookie):
+                pass
+
+        results[cookie.name] = {
+            "seconds": round(perf_counter() - start, 3),
+            "nodes": nodes if optimizer.profiled else None,
+            "value": str(cookie.objective.value(optimizer.solution)) if optimizer.solution else None,
+        }
+        if optimizer.solution is None:
+            break
+        optimizer.select(cookie.name)
+    return results
+
+
+def run_benchmark(engine: str, sizes=SIZES) -> Dict[str, Dict[str, dict]]:
+    """Runs every requirements file of the corpus on a synthetic inventory of each size"""
+    results = {}
+    for size in sizes:
+        toppings = synthetic_inventory(size, seed=size)
+        for fp in sorted(BENCH_PATH.glob("*.yaml")):
+            results[f"{fp.stem}-{size}"] = run_file(engine, fp, toppings)
+    return results
+
+
+def seed_disagreements(engine: str, sizes=SIZES) -> List[str]:
+    """
+    Cookies solved to another value with the greedy warm start than without it, a seed may only speed up a solve
+
+    Both solve the cookies of a requirements file in order, once they pick different sets of the same value the later
+    cookies draw on different inventories and are no longer compared
+    """
+    disagreements = []
+    for size in sizes:
+        toppings = synthetic_inventory(size, seed=size)
+        for fp in sorted(BENCH_PATH.glob("*.yaml")):
+            warm, cold = ENGINES[engine](toppings), ENGINES[engine](toppings)
+            cold.warm = False
+            for seeded, unseeded in zip(Requirements.from_yaml(fp), Requirements.from_yaml(fp)):
+                for optimizer, cookie in ((warm, seeded), (cold, unseeded)):
+                    with solve_scope(cookie.name):
+                        for _ in optimizer.solve(cookie):
+                            pass
+
+                values = [
+                    cookie.objective.value(o.solution) if o.solution else None
+                    for o, cookie in ((warm, seeded), (cold, unseeded))
+                ]
+                if values[0] != values[1]:
+                    disagreements.append(f"{fp.stem}-{size} {seeded.name}: seeded {values[0]} unseeded {values[1]}")
+                if values[0] != values[1] or warm.solution is None or warm.solution.key() != cold.solution.key():
+                    break
+                warm.select(seeded.name)
+                cold.select(unseeded.name)
+    return disagreements
+
+
+def cancel_delay(engine: str = "parallel", size: int = SIZES[-1]):
+    """
+    Seconds an optimize_cookie process takes to exit once its cancel byte is set, None if it finished before
+
+    The first normal cookie of the largest inventory, the slowest bench solve, runs well past CANCEL_AFTER
+    """
+    optimizer = ENGINES[engine](synthetic_inventory(size, seed=size))
+    cookie = Requirements.from_yaml(BENCH_PATH / "normal.yaml")[0]
+    solution, best = Array("i", 5, lock=False), Array("d", [0, float("-inf")], lock=False)
+
+    shared_memory = SharedMemory(create=True, size=64)
+    process = Process(target=optimize_cookie, args=(optimizer, cookie, shared_memory.name, solution, best))
+    process.start()
+    process.join(CANCEL_AFTER)
+
+    start = perf_counter()
+    running = process.is_alive()
+    shared_memory.buf[-1] = 1
+    process.join()
+    delay = perf_counter() - start
+
+    shared_memory.close()
+    shared_memory.unlink()
+    return delay if running else None
+
+
+def exhaustive(toppings: List[Topping], reqs: Requirements):
+    """Best objective value over every valid set of the toppings, reqs already realized"""
+    best = None
+    for combo in combinations([topping for topping in toppings if topping.resonance in reqs.resonance], 5):
+        topping_set = ToppingSet(list(combo))
+        if reqs.satisfied(topping_set):
+            value = reqs.objective.value(topping_set)
+            if best is None or value > best:
+                best = value
+    return best
+
+
+def exact_disagreements(engine: str, seeds=EXACT_SEEDS) -> List[str]:
+    """Cookies of small synthetic inventories an engine solves to another value than the exhaustive search"""
+    disagreements = []
+    for seed in seeds:
+        toppings = synthetic_inventory(EXACT_SIZE, seed=seed)
+        for fp in sorted(BENCH_PATH.glob("*.yaml")):
+            optimizer = ENGINES[engine](toppings)
+            for cookie in Requirements.from_yaml(fp):
+                with solve_scope(cookie.name):
+                    for _ in optimizer.solve(cookie):
+                        pass
+
+                value = cookie.objective.value(optimizer.solution) if optimizer.solution else None
+                if value != (best := exhaustive(optimizer.inventory, cookie)):
+                    disagreements.append(
+                        f"{fp.stem}-{EXACT_SIZE}-{seed} {cookie.name}: solved {value} exhaustive {best}"
+                    )
+                    break
+                if optimizer.solution is None:
+                    break
+                optimizer.select(cookie.name)
+    return disagreements
+
+
+def load_baselines() -> dict:
+    """Stored results per engine"""
+    try:
+        with open(BASELINE_FP) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_baseline(engine: str, results: dict):
+    baselines = load_baselines()
+    baselines[engine] = results
+    with open(BASELINE_FP, "w") as f:
+        json.dump(baselines, f, indent=2)
+
+
+def compare(results: dict, baseline: dict, slowdown: float = SLOWDOWN) -> List[str]:
+    """Regressions of results against the baseline, a changed solution value or a slower or larger search"""
+    regressions = []
+    for case, cookies in results.items():
+        for name, result in cookies.items():
+            if (base := baseline.get(case, {}).get(name)) is None:
+                continue
+            if result["value"] != base["value"]:
+                regressions.append(f"{case} {name}: value {base['value']} -> {result['value']}")
+            if result["seconds"] > max(base["seconds"] * slowdown, base["seconds"] + NOISE):
+                regressions.append(f"{case} {name}: seconds {base['seconds']} -> {result['seconds']}")
+            if None not in (result["nodes"], base["nodes"]) and result["nodes"] > base["nodes"]:
+                regressions.append(f"{case} {name}: nodes {base['nodes']} -> {result['nodes']}")
+    return regressions
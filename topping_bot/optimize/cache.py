@@ -0,0 +1,160 @@
+import json
+from decimal import Decimal
+from hashlib import sha256
+from pathlib import Path
+from typing import List, Optional
+
+from topping_bot.optimize.requirements import Requirements
+from topping_bot.optimize.toppings import Resonance, Topping, ToppingSet
+from topping_bot.util.const import CONFIG, TMP_PATH
+
+SOLVER_VERSION = 3  # bumped when a fix changes solve results, solves of older versions are never returned
+
+
+def number(value) -> str:
+    """Canonical string of a requirement number, 30 / 30.0 / 30.00 all hash the same"""
+    if isinstance(value, Decimal):
+        return format(value.normalize(), "f")
+    return str(value)
+
+
+def topping_record(topping: Topping):
+    return [topping.resonance.value if topping.resonance else None, [[s.value, number(v)] for s, v in topping.substats]]
+
+
+def inventory_fingerprint(toppings: List[Topping]) -> str:
+    """Hash of the topping multiset, independent of inventory order"""
+    records = sorted(json.dumps(topping_record(topping)) for topping in toppings)
+    return sha256("\n".join(records).encode("utf-8")).hexdigest()
+
+
+def requirements_fingerprint(reqs: Requirements) -> str:
+    """Hash of realized requirements, relative constraints are already resolved into plain targets"""
+    objective = reqs.objective
+    normalized = {
+        "valid": sorted(f"{valid.substat.value} {valid.op} {number(valid.target)}" for valid in reqs.valid),
+        "objective": [objective.type.value, sorted(substat.value for substat in objective.types)],
+        "mods": sorted((substat.value, number(mod)) for substat, mod in reqs.mods.items()),
+        "resonance": sorted(resonance.value for resonance in reqs.resonance),
+    }
+    return sha256(json.dumps(normalized).encode("utf-8")).hexdigest()
+
+
+def objective_fingerprint(reqs: Requirements) -> str:
+    """Hash of the objective, modifiers and resonance, requirements sharing it value every set alike"""
+    objective = reqs.objective
+    normalized = {
+        "objective": [objective.type.value, sorted(substat.value for substat in objective.types)],
+        "mods": sorted((substat.value, number(mod)) for substat, mod in reqs.mods.items()),
+        "resonance": sorted(resonance.value for resonance in reqs.resonance),
+    }
+    return sha256(json.dumps(normalized).encode("utf-8")).hexdigest()
+
+
+class SolveCache:
+    """
+    Persistent cache of solved topping sets
+
+    Entries are keyed by the inventory multiset and the realized requirements, so rerunning an unchanged requirement
+    file on an unchanged inventory skips the search. The latest set per requirements is also kept as a seed for solves
+    on a changed inventory. Each entry is a json file, least recently used entries are evicted once the cache grows
+    past its entry or byte limit
+    """
+
+    def __init__(self, path: Path, max_entries: int = 2000, max_bytes: int = 16_000_000):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.path.mkdir(exist_ok=True)
+
+    def key_path(self, inventory: List[Topping], reqs: Requirements):
+        key = f"{SOLVER_VERSION}:{inventory_fingerprint(inventory)}:{requirements_fingerprint(reqs)}"
+        key = sha256(key.encode("utf-8"))
+        return self.path / f"{key.hexdigest()}.json"
+
+    def seed_path(self, reqs: Requirements):
+        return self.path / f"seed-{requirements_fingerprint(reqs)}.json"
+
+    def get(self, inventory: List[Topping], reqs: Requirements) -> Optional[List[int]]:
+        """Inventory indices of the cached solve, empty if no valid set exists, None when not cached"""
+        fp = self.key_path(inventory, reqs)
+        if (entry := self.load(fp)) is None:
+            return None
+
+        if entry["toppings"] is None:
+            fp.touch()
+            return []
+
+        if (indices := self.resolve(entry, inventory)) is None:
+            return None
+        if str(reqs.objective.value(ToppingSet([inventory[i] for i in indices]))) != entry["objective"]:
+            return None
+
+        fp.touch()
+        return indices
+
+    def seed(self, inventory: List[Topping], reqs: Requirements) -> Optional[List[int]]:
+        """Inventory indices of the last set solved for these requirements, None if it is no longer in inventory"""
+        fp = self.seed_path(reqs)
+        if (entry := self.load(fp)) is None:
+            return None
+
+        fp.touch()
+        return self.resolve(entry, inventory)
+
+    @staticmethod
+    def load(fp: Path):
+        try:
+            with open(fp) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def resolve(entry: dict, inventory: List[Topping]) -> Optional[List[int]]:
+        """Maps the toppings of an entry onto inventory indices, preferring the stored indices"""
+        indices = []
+        for i, record in zip(entry["indices"], entry["toppings"]):
+            topping = Topping(record[1], Resonance(record[0]) if record[0] else None)
+            if not (0 <= i < len(inventory) and i not in indices and inventory[i] == topping):
+                # inventory was reordered or changed since the solve, find the same topping by value
+                i = next((j for j, t in enumerate(inventory) if j not in indices and t == topping), None)
+                if i is None:
+                    return None
+            indices.append(i)
+        return indices
+
+    def put(self, inventory: List[Topping], reqs: Requirements, indices: List[int]):
+        """Stores a finished solve, an empty indices list records that no valid set exists"""
+        if indices:
+            toppings = [inventory[i] for i in indices]
+            entry = {
+                "indices": list(indices),
+                "toppings": [topping_record(topping) for topping in toppings],
+                "objective": str(reqs.objective.value(ToppingSet(toppings))),
+            }
+        else:
+            entry = {"indices": [], "toppings": None, "objective": None}
+
+        with open(self.key_path(inventory, reqs), "w") as f:
+            json.dump(entry, f)
+        if indices:  # latest set for these requirements, warm starts solves on a changed inventory
+            with open(self.seed_path(reqs), "w") as f:
+                json.dump(entry, f)
+        self.evict()
+
+    def evict(self):
+        """Removes least recently used entries until the cache fits its limits"""
+        entries = sorted(self.path.glob("*.json"), key=lambda fp: fp.stat().st_mtime, reverse=True)
+        total = 0
+        for i, fp in enumerate(entries):
+            total += fp.stat().st_size
+            if i >= self.max_entries or total > self.max_bytes:
+                fp.unlink(missing_ok=True)
+
+
+SOLVE_CACHE = SolveCache(
+    TMP_PATH / "solves",
+    max_entries=CONFIG["optimizer"].get("cache-entries", 2000),
+    max_bytes=CONFIG["optimizer"].get("cache-bytes", 16_000_000),
+)
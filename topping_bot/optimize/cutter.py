@@ -19,17 +19,53 @@ class Prune(Flag):
     COMBINED_SPECIAL_ALL_FAILURE = auto()
 
 
+COMBINED_FAILURES = (
+    Prune.COMBINED_VALID_FAILURE,
+    Prune.COMBINED_OBJ_FAILURE,
+    Prune.COMBINED_ALL_FAILURE,
+    Prune.COMBINED_SPECIAL_OBJ_FAILURE,
+    Prune.COMBINED_SPECIAL_ALL_FAILURE,
+)
+SPECIAL_FAILURES = (Prune.COMBINED_SPECIAL_OBJ_FAILURE, Prune.COMBINED_SPECIAL_ALL_FAILURE)
+
+
 class Cutter:
     def __init__(self, reqs: Requirements):
         self.reqs = reqs
+        self.bonused = (
+            {r.substat for r in reqs.floor_reqs()}
+            | {r.substat for r in reqs.ceiling_reqs()}
+            | set(reqs.objective.types)
+        )
+
+    def value(self, topping: Topping, substats):
+        return topping.value(substats)
+
+    def flavor(self, topping: Topping):
+        """
+        Flavor class of a topping, None when its flavor earns no relevant set bonus
+
+        A failed topping stands in for a later one of its class, and for a later one of class None on every check but
+        the ceiling one, as it earns the same or more set bonuses. A failed topping of class None stands in for later
+        ones of every class on the ceiling check
+
+        The combined checks bound sets under the flavor counts the floors and the incumbent require of a node, those
+        depend on every substat of its toppings. A failed topping only stands in for later ones it dominates on every
+        relevant substat, then each set of theirs is matched by one of its own that is no worse and needs no more. The
+        special bounds clamp objective substats to their ceilings, so they only stand in while the node meets them
+        """
+        return topping.flavor if topping.flavor in self.bonused else None
 
     def init_planes(self):
+        return defaultdict(self.flavor_planes)
+
+    def flavor_planes(self):
         return {
             Prune.FLOOR_FAILURE: defaultdict(lambda: float("-inf")),
             Prune.CEILING_FAILURE: defaultdict(lambda: float("inf")),
-            Prune.COMBINED_VALID_FAILURE: defaultdict(lambda: float("-inf")),
-            Prune.COMBINED_OBJ_FAILURE: defaultdict(lambda: float("-inf")),
-            Prune.COMBINED_ALL_FAILURE: defaultdict(lambda: float("-inf")),
+            Prune.COMBINED_VALID_FAILURE: [],
+            Prune.COMBINED_OBJ_FAILURE: [],
+            Prune.COMBINED_ALL_FAILURE: [],
             Prune.COMBINED_SPECIAL_OBJ_FAILURE: [],
             Prune.COMBINED_SPECIAL_ALL_FAILURE: [],
         }
@@ -43,49 +79,39 @@ class Cutter:
         ceil_substats: List[Type],
         non_obj_count: int,
     ):
-        if Prune.FLOOR_FAILURE in failures:
-            for s in floor_substats:
-                planes[Prune.FLOOR_FAILURE][s] = max(planes[Prune.FLOOR_FAILURE][s], topping.value(s))
+        flavor = self.flavor(topping)
         if Prune.CEILING_FAILURE in failures:
+            ceilings = planes[flavor][Prune.CEILING_FAILURE]
             for s in ceil_substats:
-                planes[Prune.CEILING_FAILURE][s] = min(planes[Prune.CEILING_FAILURE][s], topping.value(s))
-        if Prune.COMBINED_VALID_FAILURE in failures:
-            planes[Prune.COMBINED_VALID_FAILURE][non_obj_count] = max(
-                planes[Prune.COMBINED_VALID_FAILURE][non_obj_count], topping.value(self.reqs.valid_substats)
-            )
-        if Prune.COMBINED_OBJ_FAILURE in failures:
-            planes[Prune.COMBINED_OBJ_FAILURE][non_obj_count] = max(
-                planes[Prune.COMBINED_OBJ_FAILURE][non_obj_count], topping.value(self.reqs.objective.types)
-            )
-        if Prune.COMBINED_ALL_FAILURE in failures:
-            planes[Prune.COMBINED_ALL_FAILURE][non_obj_count] = max(
-                planes[Prune.COMBINED_ALL_FAILURE][non_obj_count], topping.value(self.reqs.all_substats)
-            )
-        if Prune.COMBINED_SPECIAL_OBJ_FAILURE in failures:
-            planes[Prune.COMBINED_SPECIAL_OBJ_FAILURE].append(tuple(topping.value(s) for s in self.reqs.all_substats))
-        if Prune.COMBINED_SPECIAL_OBJ_FAILURE in failures:
-            planes[Prune.COMBINED_SPECIAL_ALL_FAILURE].append(tuple(topping.value(s) for s in self.reqs.all_substats))
+                ceilings[s] = min(ceilings[s], self.value(topping, s))
+
+        for planes in [planes[flavor]] if flavor is None else [planes[flavor], planes[None]]:
+            self.update_flavor_planes(topping, planes, failures, floor_substats)
+
+    def update_flavor_planes(self, topping: Topping, planes: dict, failures: Prune, floor_substats: List[Type]):
+        if Prune.FLOOR_FAILURE in failures:
+            for s in floor_substats:
+                planes[Prune.FLOOR_FAILURE][s] = max(planes[Prune.FLOOR_FAILURE][s], self.value(topping, s))
+        for failure in COMBINED_FAILURES:
+            if failure in failures and (failure not in SPECIAL_FAILURES or Prune.CEILING_FAILURE not in failures):
+                planes[failure].append(tuple(self.value(topping, s) for s in self.reqs.all_substats))
 
     def cut_topping(self, topping: Topping, planes: dict):
-        if any(topping.value(s) <= floor for s, floor in planes[Prune.FLOOR_FAILURE].items()):
-            return True
-        if any(topping.value(s) >= floor for s, floor in planes[Prune.CEILING_FAILURE].items()):
+        flavor = self.flavor(topping)
+        if flavor is not None and None in planes and self.above_ceiling(topping, planes[None]):
             return True
-        if self.single_is_dominated(topping, planes[Prune.COMBINED_VALID_FAILURE].values(), self.reqs.valid_substats):
+        if (planes := planes.get(flavor)) is None:
+            return False
+        if any(self.value(topping, s) <= floor for s, floor in planes[Prune.FLOOR_FAILURE].items()):
             return True
-        if self.single_is_dominated(topping, planes[Prune.COMBINED_OBJ_FAILURE].values(), self.reqs.objective.types):
+        if self.above_ceiling(topping, planes):
             return True
-        if self.single_is_dominated(topping, planes[Prune.COMBINED_ALL_FAILURE].values(), self.reqs.all_substats):
-            return True
-        if self.is_dominated(topping, planes[Prune.COMBINED_SPECIAL_OBJ_FAILURE], *self.reqs.all_substats):
-            return True
-        if self.is_dominated(topping, planes[Prune.COMBINED_SPECIAL_ALL_FAILURE], *self.reqs.all_substats):
+        if any(self.is_dominated(topping, planes[failure], *self.reqs.all_substats) for failure in COMBINED_FAILURES):
             return True
         return False
 
-    def is_dominated(self, topping, plane, *substats):
-        return any(all(topping.value(s) <= p[i] for i, s in enumerate(substats)) for p in plane)
+    def above_ceiling(self, topping, planes: dict):
+        return any(self.value(topping, s) >= ceiling for s, ceiling in planes[Prune.CEILING_FAILURE].items())
 
-    def single_is_dominated(self, topping, plane, substats):
-        # return any(all(topping.value(s) <= p[i] for i, s in enumerate(substats)) for p in plane)
-        return any(topping.value(substats) <= p for p in plane)
+    def is_dominated(self, topping, plane, *substats):
+        return any(all(self.value(topping, s) <= p[i] for i, s in enumerate(substats)) for p in plane)
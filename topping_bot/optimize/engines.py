@@ -0,0 +1,11 @@
+from topping_bot.optimize.fixed import FixedOptimizer
+from topping_bot.optimize.iterative import IterativeOptimizer
+from topping_bot.optimize.optimize import Optimizer
+from topping_bot.optimize.parallel import ParallelOptimizer
+
+ENGINES = {
+    "decimal": Optimizer,
+    "fixed": FixedOptimizer,
+    "iterative": IterativeOptimizer,
+    "parallel": ParallelOptimizer,
+}
@@ -0,0 +1,461 @@
+import math
+from decimal import Decimal
+from itertools import accumulate
+from typing import List, Tuple
+
+from topping_bot.optimize.cutter import Cutter, Prune
+from topping_bot.optimize.objectives import Special
+from topping_bot.optimize.optimize import Optimizer
+from topping_bot.optimize.requirements import Requirements
+from topping_bot.optimize.toppings import INDEX, INFO, SUBSTATS, Substats, Topping, ToppingSet, Type
+
+SCALE = 10  # every substat value in INFO has a single decimal place
+SUFFIX_DEPTH = 5  # a pool never needs more than the five slots of a set, exclusions included
+COMBOS = {substat: [(count, int(bonus * SCALE)) for count, bonus in info["combos"]] for substat, info in INFO.items()}
+
+
+def to_fixed(value: Decimal):
+    """Exact tenths of a percent for a single decimal place value"""
+    return int(value * SCALE)
+
+
+def from_fixed(value: int):
+    return Decimal(value) / SCALE
+
+
+def ceil_fixed(value: Decimal):
+    """Smallest fixed value satisfying value >= target"""
+    return math.ceil(value * SCALE)
+
+
+def floor_fixed(value: Decimal):
+    """Largest fixed value satisfying value <= target"""
+    return math.floor(value * SCALE)
+
+
+def fixed_vector(topping: Topping):
+    """Topping substats as tenths of a percent, indexed by Type"""
+    vector = [0] * len(SUBSTATS)
+    for substat, value in topping.substats:
+        vector[INDEX[substat]] += to_fixed(value)
+    return tuple(vector)
+
+
+def as_tuple(substats: Substats):
+    return substats if type(substats) is tuple else (substats,)
+
+
+class SearchState:
+    """Running substat sums and flavor counts of the partial set, pushed down the dfs and undone on backtrack"""
+
+    def __init__(self, vectors: List[Tuple[int]], flavors: List[Type]):
+        self.vectors = vectors
+        self.flavors = [INDEX[flavor] for flavor in flavors]
+        self.sums = [0] * len(SUBSTATS)
+        self.counts = [0] * len(SUBSTATS)
+        self.size = 0
+
+    def push(self, topping: int):
+        for i, value in enumerate(self.vectors[topping]):
+            self.sums[i] += value
+        self.counts[self.flavors[topping]] += 1
+        self.size += 1
+
+    def pop(self, topping: int):
+        for i, value in enumerate(self.vectors[topping]):
+            self.sums[i] -= value
+        self.counts[self.flavors[topping]] -= 1
+        self.size -= 1
+
+    def raw(self, indices: Tuple[int]):
+        return sum(self.sums[i] for i in indices)
+
+    def matched(self, indices: Tuple[int]):
+        """Number of toppings whose flavor is one of the indexed substats"""
+        return sum(self.counts[i] for i in indices)
+
+
+class FixedCutter(Cutter):
+    """Cutter over topping positions, reading values from the fixed-point tables"""
+
+    def __init__(self, reqs: Requirements, optimizer: "FixedOptimizer"):
+        super().__init__(reqs)
+        self.optimizer = optimizer
+
+    def value(self, topping: int, substats):
+        return self.optimizer.table(substats)[topping]
+
+    def flavor(self, topping: int):
+        return super().flavor(self.optimizer.toppings[topping])
+
+
+class FixedOptimizer(Optimizer):
+    """
+    Optimizer running the search on fixed-point integers
+
+    Every candidate topping is stored as a vector of tenths of a percent and every bound of the prune is computed on
+    integer sums, search state is a list of positions into the presorted candidates. Decimal is only used for the
+    non-linear Special objectives and for reporting, results are identical to the Decimal optimizer
+    """
+
+    def __init__(self, toppings: List[Topping]):
+        super().__init__(toppings)
+        self.vectors = []
+        self.flavors = []
+        self.tables = {}
+        self.indices = {}
+        self.suffixes = {}
+        self.pools = {}
+        self.state = None
+        self.objective_floor = None
+        self.objective_value = None
+
+    def solve(self, reqs: Requirements, seed: List[Topping] = None):
+        """Solves a cookies needed toppings given a set of requirements, seed is an optional starting set"""
+        self.start(reqs, seed)
+        yield from self.dfs([], 0)
+        self.settle()
+
+    def start(self, reqs: Requirements, seed: List[Topping] = None):
+        """Realizes requirements and resets search state for a new solve"""
+        self.reqs = reqs
+        self.reqs.realize(self.cookies)
+
+        self.set_incumbent(None)
+        self.ranked = []
+        self.cutter = FixedCutter(reqs, self)
+        if self.stats is not None:
+            self.stats.instrument_cutter(self.cutter)
+        self.toppings = self.candidates()
+        self.prepare()
+        self.warm_start(seed)
+
+    def prepare(self):
+        """Converts candidates and requirement targets to fixed-point once per solve"""
+        self.vectors = [fixed_vector(t) for t in self.toppings]
+        self.flavors = [t.flavor for t in self.toppings]
+        self.tables = {}
+        self.indices = {}
+        self.suffixes = {}
+        self.pools = {}
+        self.state = SearchState(self.vectors, self.flavors)
+
+        self.lower = [ceil_fixed(target) for target in self.reqs.lower]
+        self.upper = [floor_fixed(target) if target.is_finite() else None for target in self.reqs.upper]
+        self.bonuses = [
+            [next((bonus for n, bonus in COMBOS[s][::-1] if count >= n), 0) for count in range(6)] for s in SUBSTATS
+        ]
+
+        self.floor_targets = [(r.substat, ceil_fixed(r.target)) for r in self.reqs.floor_reqs()]
+        self.ceiling_targets = [(r.substat, floor_fixed(r.target)) for r in self.reqs.ceiling_reqs()]
+        self.valid_floor = sum(self.reqs.floor(s) for s in self.reqs.valid_substats)
+
+    def table(self, substats: Substats):
+        """Fixed value of every candidate topping for the given substats"""
+        substats = as_tuple(substats)
+        if (table := self.tables.get(substats)) is None:
+            indices = self.substat_indices(substats)
+            table = self.tables[substats] = [sum(vector[i] for i in indices) for vector in self.vectors]
+        return table
+
+    def substat_indices(self, substats: Substats):
+        """Vector indices of the distinct substats"""
+        substats = as_tuple(substats)
+        if (indices := self.indices.get(substats)) is None:
+            indices = self.indices[substats] = tuple(INDEX[s] for s in set(substats))
+        return indices
+
+    def suffix(self, substats: Substats, flavors: Substats = None, match=True, largest=True):
+        """Suffix top-k index for the given ranking and flavor split, built once per solve"""
+        key = (as_tuple(substats), flavors and as_tuple(flavors), match, largest)
+        if (index := self.suffixes.get(key)) is None:
+            index = self.suffixes[key] = self.build_suffix(*key)
+        return index
+
+    def build_suffix(self, substats: Tuple[Type], flavors: Tuple[Type], match: bool, largest: bool):
+        """
+        index[idx] holds the SUFFIX_DEPTH best positions of toppings[idx:], ranked by value and then earliest position
+        exactly like nlargest / nsmallest over the suffix, restricted to toppings whose flavor in flavors equals match
+        """
+        table = self.table(substats)
+        index = [()] * (len(self.toppings) + 1)
+
+        best = ()
+        for i in range(len(self.toppings) - 1, -1, -1):
+            if flavors is None or (self.flavors[i] in flavors) == match:
+                value, at = table[i], 0
+                if largest:
+                    while at < len(best) and table[best[at]] > value:
+                        at += 1
+                else:
+                    while at < len(best) and table[best[at]] < value:
+                        at += 1
+                best = (best[:at] + (i,) + best[at:])[:SUFFIX_DEPTH]
+            index[i] = best
+        return index
+
+    def best(self, n: int, idx, substats: Substats, flavors: Substats = None, match=True, exclude=None, largest=True):
+        """The n best remaining toppings after idx, an O(k) lookup into the suffix index"""
+        if n <= 0:
+            return []
+
+        pool = self.suffix(substats, flavors, match, largest)[idx]
+        if exclude:
+            return [i for i in pool if i not in exclude][:n]
+        return list(pool[:n])
+
+    def topping_set(self, combo: List[int]):
+        return ToppingSet([self.toppings[i] for i in combo])
+
+    def update_solution(self, combo: List[int]):
+        """Installs combo as the incumbent if it beats the current solution"""
+        candidate = self.best_objective(self.topping_set(combo))
+        if candidate is self.solution:
+            return False
+
+        self.set_incumbent(candidate)
+        return True
+
+    def set_incumbent(self, candidate: ToppingSet):
+        super().set_incumbent(candidate)
+        self.objective_floor = None if candidate is None else self.reqs.objective.floor(candidate)
+        self.objective_value = None if candidate is None else self.reqs.objective.value(candidate)
+
+    def dfs(self, combo: List[int], idx):
+        """Dfs combination generator, dfs so a benchmark solution is found as soon as possible"""
+        if len(combo) == 1:
+            yield self.toppings[combo[0]]
+        if (reason := self.prune(combo, idx))[0] != Prune.NONE:
+            return reason
+        if len(combo) == 5:
+            self.update_solution(combo)
+            return
+        if idx == len(self.toppings):
+            return
+
+        planes = self.cutter.init_planes()
+        for i in range(idx, len(self.toppings)):
+            if i > idx and self.repeats[i]:  # an identical copy already led this slot, its sets were all searched
+                continue
+            if self.cutter.cut_topping(i, planes):
+                continue
+
+            self.state.push(i)
+            reason = yield from self.dfs(combo + [i], i + 1)
+            self.state.pop(i)
+
+            if reason is None:
+                continue
+
+            self.cutter.update_planes(i, planes, *reason)
+
+    def raw(self, extra: List[int], substats: Substats):
+        """Fixed raw value of the partial set extended by the extra toppings"""
+        table = self.table(substats)
+        return self.state.raw(self.substat_indices(substats)) + sum(table[i] for i in extra)
+
+    def set_effect(self, extra: List[int], substat: Type):
+        count = self.state.counts[INDEX[substat]] + sum(1 for i in extra if self.flavors[i] == substat)
+        for required_count, set_bonus in COMBOS[substat][::-1]:
+            if count >= required_count:
+                return set_bonus
+        return 0
+
+    def value(self, extra: List[int], substats: Substats):
+        """Fixed value of the partial set extended by the extra toppings, set bonuses included"""
+        return sum(self.raw(extra, s) + self.set_effect(extra, s) for s in as_tuple(substats))
+
+    def prune(self, combo: List[int], idx):
+        """Prune a combination subtree from consideration if it is unfavorable"""
+        failures = Prune.NONE
+
+        if self.state.size == 5:  # full set, one pass over the compiled requirement bounds
+            floor_failures, ceil_failures = self.violations()
+            if floor_failures:
+                failures |= Prune.FLOOR_FAILURE
+            if ceil_failures:
+                failures |= Prune.CEILING_FAILURE
+            return failures, floor_failures, ceil_failures, 0
+
+        floor_failures = []
+        overall_set_requirements = {}
+        for substat, required in self.floor_targets:  # valid floor check
+            for potential_req_count, extra in self.floor_case(idx, substat):
+                if self.value(extra, substat) >= required:
+                    overall_set_requirements[substat] = potential_req_count
+                    break
+
+            if overall_set_requirements.get(substat) is None:
+                failures |= Prune.FLOOR_FAILURE
+                floor_failures.append(substat)
+
+        non_objective_count = sum(overall_set_requirements.values())
+
+        ceil_failures = []
+        for substat, required in self.ceiling_targets:  # valid ceiling check
+            extra = self.ceiling_case(idx, substat)
+            if extra is None or not self.value(extra, substat) <= required:
+                failures |= Prune.CEILING_FAILURE
+                ceil_failures.append(substat)
+
+        objective = self.reqs.objective
+        if self.solution and len(combo) != 5:  # objective floor check
+            required = floor_fixed(self.objective_floor)
+            for potential_req_count, potential_combined in self.objective_case(idx):
+                if potential_combined > required:
+                    existing_req = sum(overall_set_requirements.get(s, 0) for s in objective.types)
+                    overall_set_requirements[objective.types] = max(potential_req_count - existing_req, 0)
+                    break
+
+            if overall_set_requirements.get(objective.types) is None:
+                failures |= Prune.FLOOR_FAILURE
+                floor_failures.append(objective.types)
+
+        if sum(overall_set_requirements.values()) > 5 - len(combo):  # combined topping req count check
+            failures |= Prune.CONFLICTING_REQS_FAILURE
+
+        if self.solution and len(combo) != 5:
+            valid_floor, objective_floor = self.valid_floor, self.objective_floor
+
+            combined = self.combined_value(idx, self.reqs.valid_substats, overall_set_requirements)
+            if combined is None or combined < ceil_fixed(valid_floor):  # partial informed combined valid check
+                failures |= Prune.COMBINED_VALID_FAILURE
+
+            combined = self.combined_value(idx, objective.types, overall_set_requirements)
+            if combined is None or combined < ceil_fixed(objective_floor):  # partial informed combined obj check
+                failures |= Prune.COMBINED_OBJ_FAILURE
+
+            combined = self.combined_value(idx, self.reqs.all_substats, overall_set_requirements)
+            if combined is None or combined < ceil_fixed(valid_floor + objective_floor):  # combined all check
+                failures |= Prune.COMBINED_ALL_FAILURE
+
+            if isinstance(objective, Special):
+                overall_set_requirements.pop(objective.types, None)
+
+                obj_value_met, all_value_met = self.special_check(
+                    self.special_case(idx, overall_set_requirements, valid_floor), self.objective_value
+                )
+
+                if not obj_value_met:  # partial informed special obj check
+                    failures |= Prune.COMBINED_SPECIAL_OBJ_FAILURE
+                if not all_value_met:  # partial informed special all check
+                    failures |= Prune.COMBINED_SPECIAL_ALL_FAILURE
+
+        return failures, floor_failures, ceil_failures, non_objective_count
+
+    def violations(self):
+        """Substats of the full set in the search state below their floor and above their ceiling"""
+        sums, counts = self.state.sums, self.state.counts
+        floors, ceilings = [], []
+        for i in self.reqs.bounded:
+            value = sums[i] + self.bonuses[i][counts[i]]
+            if value < self.lower[i]:
+                floors.append(SUBSTATS[i])
+            elif self.upper[i] is not None and value > self.upper[i]:
+                ceilings.append(SUBSTATS[i])
+        return floors, ceilings
+
+    def fill_out_combo(self, idx, substats: Substats, set_reqs: dict):
+        extra = []
+        for req_substats, req_count in set_reqs.items():
+            if req_count:
+                extra += self.best(req_count, idx, substats, flavors=req_substats)
+
+        if len(extra) == sum(set_reqs.values()):
+            return extra
+
+    def floor_case(self, idx, substats: Substats):
+        if self.state.size == 5:
+            yield 0, []
+            return
+
+        n = 5 - self.state.size
+        match_pool = self.best(n, idx, substats, flavors=substats)
+        wild_pool = self.best(n, idx, substats, flavors=substats, match=False)
+
+        for match_count in range(n + 1):
+            wild_count = n - match_count
+
+            extra = match_pool[:match_count] + wild_pool[:wild_count]
+            if len(extra) == n:
+                yield match_count, extra
+
+    def ceiling_case(self, idx, substats: Substats):
+        if self.state.size == 5:
+            return []
+
+        n = 5 - self.state.size
+        extra = self.best(n, idx, substats, largest=False)
+        if len(extra) == n:
+            return extra
+
+    def objective_case(self, idx):
+        types = self.reqs.objective.types
+        for potential_req_count, extra in self.floor_case(idx, types):
+            potential_value = self.raw(extra, types)
+            potential_value += self.best_possible_set_effect(types, 5 - self.state.size - potential_req_count)
+            yield potential_req_count, potential_value
+
+    def combined_case(self, idx, substats: Substats, set_reqs: dict = None):
+        extra = []
+        if set_reqs is not None:
+            extra = self.fill_out_combo(idx, substats, set_reqs)
+
+            if extra is None:
+                return None
+
+        if self.state.size + len(extra) != 5:
+            extra = extra + self.best(5 - self.state.size - len(extra), idx, substats, exclude=set(extra))
+
+        if self.state.size + len(extra) == 5:
+            return extra
+
+    def combined_value(self, idx, substats: Substats, set_reqs: dict = None):
+        extra = self.combined_case(idx, substats, set_reqs)
+        if extra is None:
+            return
+
+        full_value = self.raw(extra, substats)
+        full_value += self.best_possible_set_effect(substats, 0)
+        return full_value
+
+    def best_possible_set_effect(self, substats: Tuple[Type], non_match_count: int):
+        best_set_bonuses = {2: 0, 3: 0, 5: 0}
+
+        non_match = self.state.size - self.state.matched(self.substat_indices(substats))
+        for s in substats:
+            for req, bonus in COMBOS[s]:
+                if non_match_count <= 5 - req - non_match:
+                    best_set_bonuses[req] = max(best_set_bonuses[req], bonus)
+
+        return max(best_set_bonuses[2] + best_set_bonuses[3], best_set_bonuses[5])
+
+    def special_case(self, idx, set_reqs: dict, valid_floor: Decimal):
+        """Special objective bounds of every split of the open slots over the flavor groups"""
+        n, functions, flavors = 5 - self.state.size, self.special_functions(), self.special_flavors(set_reqs)
+
+        groups = [
+            [list(accumulate((table[i] for i in index[idx][:n]), initial=0)) for table, index in pools]
+            for pools in self.special_pools(flavors)
+        ]
+
+        raws = [self.state.raw(self.substat_indices(f)) for f in functions]
+        counts = {s: self.state.counts[INDEX[s]] for s in self.reqs.all_substats}
+        yield from self.special_bounds(n, flavors, groups, set_reqs, raws, counts, valid_floor)
+
+    def special_pools(self, flavors: Tuple[Type]):
+        """Value table and suffix index of every special function per flavor group, built once per solve"""
+        if (pools := self.pools.get(flavors)) is None:
+            groups = [((flavor,), True) for flavor in flavors] + [(flavors, False)]
+            pools = self.pools[flavors] = [
+                [(self.table(f), self.suffix(f, group, match)) for f in self.special_functions()]
+                for group, match in groups
+            ]
+        return pools
+
+    def set_bonus(self, substat: Type, count: int):
+        return self.bonuses[INDEX[substat]][count]
+
+    @staticmethod
+    def scaled(value: int):
+        return from_fixed(value)
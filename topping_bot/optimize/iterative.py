@@ -0,0 +1,93 @@
+from typing import List
+
+from topping_bot.optimize.cutter import Prune
+from topping_bot.optimize.fixed import FixedOptimizer
+from topping_bot.optimize.requirements import Requirements
+from topping_bot.optimize.toppings import Topping
+
+
+class IterativeOptimizer(FixedOptimizer):
+    """
+    Fixed-point optimizer running the dfs on an explicit stack
+
+    The subtree of every top level topping is searched by a loop over per depth cursors and cutting planes, the set is
+    kept in preallocated prefixes so no generator or list is created per node. Only the top level loop yields, once
+    per topping like the recursive engines, nodes are visited in the same order so results are identical
+    """
+
+    def __init__(self, toppings: List[Topping]):
+        super().__init__(toppings)
+        self.prefixes = [[0] * size for size in range(6)]  # prefixes[size] holds the first size toppings of the set
+        self.cursors = [0] * 6
+        self.planes = [None] * 6
+
+    def solve(self, reqs: Requirements, seed: List[Topping] = None):
+        """Solves a cookies needed toppings given a set of requirements, seed is an optional starting set"""
+        self.start(reqs, seed)
+        yield from self.root()
+        self.settle()
+
+    def root(self):
+        """Top level loop of the dfs, yields every topping before searching the sets it leads"""
+        if self.prune(self.prefixes[0], 0)[0] != Prune.NONE:
+            return
+
+        planes = self.cutter.init_planes()
+        for i in range(len(self.toppings)):
+            if i > 0 and self.repeats[i]:  # an identical copy already led this slot, its sets were all searched
+                continue
+            if self.cutter.cut_topping(i, planes):
+                continue
+
+            yield self.toppings[i]
+            if (reason := self.search(i)) is not None:
+                self.cutter.update_planes(i, planes, *reason)
+
+    def search(self, lead: int):
+        """Searches every set led by toppings[lead] in dfs order, returns the prune reason of the lead like dfs"""
+        n, state, repeats, prefixes, cursors, planes = (
+            len(self.toppings),
+            self.state,
+            self.repeats,
+            self.prefixes,
+            self.cursors,
+            self.planes,
+        )
+        prune, cut_topping, update_planes = self.prune, self.cutter.cut_topping, self.cutter.update_planes
+
+        size, topping = 0, lead
+        while True:
+            # enter the node extending the set by topping
+            for prefix in prefixes[size + 1 :]:
+                prefix[size] = topping
+            state.push(topping)
+            size += 1
+            combo = prefixes[size]
+
+            opened = False
+            if (reason := prune(combo, topping + 1))[0] == Prune.NONE:
+                reason = None
+                if size == 5:
+                    self.update_solution(combo)
+                elif topping + 1 < n:
+                    cursors[size], planes[size], opened = topping + 1, self.cutter.init_planes(), True
+
+            # leave finished nodes until one has a child left to enter
+            while True:
+                if not opened:
+                    state.pop(topping)
+                    size -= 1
+                    if size == 0:
+                        return reason
+                    if reason is not None:
+                        update_planes(topping, planes[size], *reason)
+
+                first, i, level = prefixes[size][size - 1] + 1, cursors[size], planes[size]
+                while i < n and ((i > first and repeats[i]) or cut_topping(i, level)):
+                    i += 1
+
+                if i < n:
+                    cursors[size], topping = i + 1, i
+                    break
+
+                opened, reason, topping = False, None, prefixes[size][size - 1]
@@ -0,0 +1,95 @@
+from contextlib import contextmanager
+from functools import wraps
+from typing import Dict
+
+from tqdm import tqdm
+
+from topping_bot.util.const import CONFIG, DEBUG
+
+MISSING = object()
+
+
+class Memo:
+    """
+    Bounded memo of values computed during a solve, keyed by inventory indices rather than object identity
+
+    Memos only answer inside a solve scope, where every topping comes from one inventory. Once full the oldest entries
+    are evicted first, hits and misses are counted so the memos that pay off can be told apart from the ones that do
+    not
+    """
+
+    active = False
+
+    def __init__(self, name: str, max_entries: int):
+        self.name = name
+        self.max_entries = max_entries
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Memoized value of key, MISSING when it has to be computed"""
+        value = self.entries.get(key, MISSING)
+        if value is MISSING:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = value
+        if len(self.entries) > self.max_entries:
+            del self.entries[next(iter(self.entries))]
+        return value
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def report(self):
+        lookups = self.hits + self.misses
+        rate = self.hits / lookups * 100 if lookups else 0
+        return f"{self.name} : {self.hits}/{lookups} hits ({rate:.1f}%), {len(self.entries)} entries"
+
+
+MEMOS: Dict[str, Memo] = {}
+
+
+def solve_memo(name: str) -> Memo:
+    """Registered memo, every one is cleared together once a solve scope ends"""
+    if (memo := MEMOS.get(name)) is None:
+        memo = MEMOS[name] = Memo(name, CONFIG["optimizer"].get("memo-entries", 200_000))
+    return memo
+
+
+@contextmanager
+def solve_scope(name: str = "solve"):
+    """Enables the memos for one solve over a single inventory, reporting their hit rates and clearing them after"""
+    Memo.active = True
+    try:
+        yield
+    finally:
+        Memo.active = False
+        DEBUG and tqdm.write(f"{name} memos\n" + "\n".join(memo.report() for memo in MEMOS.values()))
+        for memo in MEMOS.values():
+            memo.clear()
+
+
+def memoized(memo: Memo):
+    """Memoizes an objective method of a topping set under the objective token and the set's inventory indices"""
+
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, topping_set):
+            if not Memo.active or (key := topping_set.key()) is None:
+                return method(self, topping_set)
+
+            key = (self.token, key)
+            if (value := memo.get(key)) is MISSING:
+                value = memo.put(key, method(self, topping_set))
+            return value
+
+        return wrapper
+
+    return decorator
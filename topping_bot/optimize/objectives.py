@@ -1,11 +1,16 @@
 from abc import ABC, abstractmethod
-from decimal import Decimal, ROUND_UP
+from decimal import Decimal, ROUND_FLOOR
 from functools import cache
 import math
-from typing import List
+from itertools import count
 
 
-from topping_bot.optimize.toppings import Topping, ToppingSet, Type
+from topping_bot.optimize.memo import memoized, solve_memo
+from topping_bot.optimize.toppings import ToppingSet, Type
+
+SET_VALUES = solve_memo("objective value")
+SET_FLOORS = solve_memo("objective floor")
+TOKENS = count()
 
 
 class Objective:
@@ -13,6 +18,7 @@ class Objective:
 
     def __init__(self, substat: Type):
         self.type = substat
+        self.token = next(TOKENS)  # memo key, copies value sets alike and share it
 
     @property
     @cache
@@ -40,9 +46,17 @@ class Special(Objective, ABC):
         super().__init__(*args, **kwargs)
 
     @abstractmethod
-    def special_upper(self, combined: Decimal, full_set: ToppingSet, combo: List[Topping]):
+    def special_upper(self, combined: Decimal, lows: dict, highs: dict):
+        """
+        Maximum objective of a set whose objective substats, set bonuses included, sum to at most combined with each
+        substat between its low and high, None when no such set exists
+        """
         pass
 
+    def limits(self, substat: Type, lows: dict, highs: dict):
+        """Range of a substat, highs are capped by its ceiling requirement"""
+        return lows[substat], min(highs[substat], Decimal(self.bounds[substat]["max"]) * 100)
+
 
 class Combo(Special):
     def __init__(self, objectives: list, modifiers: dict):
@@ -55,26 +69,23 @@ class Combo(Special):
     def types(self):
         return tuple(self.objectives)
 
-    @cache
+    @memoized(SET_VALUES)
     def value(self, topping_set: ToppingSet):
         """Combined value of valued substats"""
         return sum(topping_set.value(substat) for substat in self.objectives)
 
-    def special_upper(self, combined: Decimal, full_set: ToppingSet, combo: List[Topping]):
-        """Maximum Combo value possible given combined value pool"""
-        combo = ToppingSet(combo)
-        for substat in self.objectives:
-            combined -= combo.value(substat) - min(  # don't min check, always want to maximize
-                combo.value(substat) / Decimal(100), self.bounds[substat]["max"]
-            ) * Decimal(100)
-        return combined
+    def special_upper(self, combined: Decimal, lows: dict, highs: dict):
+        """Maximum Combo value possible given combined value pool and substat ranges"""
+        limits = [self.limits(substat, lows, highs) for substat in self.objectives]
+        if combined < sum(low for low, _ in limits):
+            return None
+        return min(combined, sum(high for _, high in limits))
 
-    @cache
     def upper(self, combined: Decimal):
         """Maximum possible combined value given combined value pool"""
         return combined
 
-    @cache
+    @memoized(SET_FLOORS)
     def floor(self, topping_set: ToppingSet):
         return self.value(topping_set)
 
@@ -100,7 +111,7 @@ class EDMG(Special):
     def e_dmg(self, atk: Decimal, crit: Decimal):
         return (self.crit_dmg - 1) * atk * crit + (1 + self.mult) * atk
 
-    @cache
+    @memoized(SET_VALUES)
     def value(self, topping_set: ToppingSet):
         """E[DMG] of a given topping set"""
         atk = topping_set.value(Type.ATK) / Decimal("100") + self.base_atk
@@ -108,42 +119,38 @@ class EDMG(Special):
 
         return self.e_dmg(atk, crit)
 
-    def special_upper(self, combined: Decimal, full_set: ToppingSet, combo: List[Topping]):
-        """Maximum E[DMG] possible given combined atk/crit pool"""
-        combo = ToppingSet(combo)
-        atk, crit = (
-            combo.value(Type.ATK) / Decimal("100") + self.base_atk,
-            combo.value(Type.CRIT) / Decimal("100") + self.base_crit,
-        )
+    def special_upper(self, combined: Decimal, lows: dict, highs: dict):
+        """Maximum E[DMG] possible given combined atk/crit pool and atk/crit ranges"""
+        low_atk, high_atk = self.limits(Type.ATK, lows, highs)
+        low_crit, high_crit = self.limits(Type.CRIT, lows, highs)
 
-        combined = combined / Decimal("100") + self.base_atk + self.base_crit
-        optimal_atk = (combined * (self.crit_dmg - 1) + (1 + self.mult)) / (2 * (self.crit_dmg - 1))
+        combined = min(combined, high_atk + high_crit)  # E[DMG] grows with both, the whole pool is spent
+        low_atk, high_atk = max(low_atk, combined - high_crit), min(high_atk, combined - low_crit)
+        if low_atk > high_atk:
+            return None
 
-        ideal_possible_atk = (
-            max(min(max(atk, optimal_atk) - self.base_atk, self.bounds[Type.ATK]["max"]), self.bounds[Type.ATK]["min"])
-            + self.base_atk
-        )
-        ideal_possible_crit = (
-            max(
-                min(max(crit, combined - ideal_possible_atk) - self.base_crit, self.bounds[Type.CRIT]["max"]),
-                self.bounds[Type.CRIT]["min"],
-            )
-            + self.base_crit
-        )
-        ideal_possible_atk = combined - ideal_possible_crit
+        if self.crit_dmg > 1:  # E[DMG] along the pool is a concave parabola in atk
+            total = combined / Decimal("100") + self.base_atk + self.base_crit
+            optimal_atk = (total * (self.crit_dmg - 1) + (1 + self.mult)) / (2 * (self.crit_dmg - 1))
+            atk = min(max((optimal_atk - self.base_atk) * Decimal("100"), low_atk), high_atk)
+        else:
+            atk = high_atk
 
-        return self.e_dmg(ideal_possible_atk, ideal_possible_crit)
+        return self.e_dmg(atk / Decimal("100") + self.base_atk, (combined - atk) / Decimal("100") + self.base_crit)
 
-    @cache
+    @memoized(SET_FLOORS)
     def floor(self, topping_set: ToppingSet):
-        """Minimum combined atk/crit pool needed to meet topping set E[DMG]"""
+        """
+        Minimum combined atk/crit pool needed to meet topping set E[DMG], rounded down as sets only beat it with a
+        larger pool
+        """
         obj = self.value(topping_set)
 
-        minimum_atk = Decimal(math.sqrt(obj / (self.crit_dmg - 1)))
+        minimum_atk = (obj / (self.crit_dmg - 1)).sqrt()
         minimum_crit = (obj - (1 + self.mult) * minimum_atk) / ((self.crit_dmg - 1) * minimum_atk)
 
         return ((minimum_atk + minimum_crit - self.base_atk - self.base_crit) * Decimal(100)).quantize(
-            Decimal(".1"), rounding=ROUND_UP
+            Decimal(".1"), rounding=ROUND_FLOOR
         )
 
     def fancy_value(self, topping_set: ToppingSet):
@@ -169,7 +176,7 @@ class Vitality(Special):
     def vitality(hp, dmgres):
         return hp * (Decimal(1) / (Decimal(1) - dmgres))
 
-    @cache
+    @memoized(SET_VALUES)
     def value(self, topping_set: ToppingSet):
         """Vitality of a given topping set"""
         hp = topping_set.value(Type.HP) / Decimal("100") + self.base_hp
@@ -177,37 +184,27 @@ class Vitality(Special):
 
         return self.vitality(hp, dmgres)
 
-    def special_upper(self, combined: Decimal, full_set: ToppingSet, combo: List[Topping]):
-        """Maximum Vitality possible given combined hp/dmgres pool"""
-        combo = ToppingSet(combo)
-        dmgres = combo.value(Type.DMGRES) / Decimal("100")
-        hp = combo.value(Type.HP) / Decimal("100")
-
-        combined = combined / Decimal("100")
-
-        _, bonus = full_set.set_effect(Type.DMGRES)
-        obj_count = len([top for top in full_set.toppings[len(combo.toppings) :] if top.flavor == Type.DMGRES])
-        max_additional_dmgres = (
-            (obj_count * (Decimal("6") + Decimal("4.1"))) + (5 - obj_count - len(combo.toppings)) * Decimal("6") + bonus
-        ) / Decimal("100")
-
-        ideal_possible_dmgres = min(
-            min(combined, dmgres + max_additional_dmgres), self.bounds[Type.DMGRES]["max"]
-        )  # don't min check, always want to maximize
-        ideal_possible_hp = max(
-            min(max(hp, combined - ideal_possible_dmgres), self.bounds[Type.DMGRES]["max"]),
-            self.bounds[Type.DMGRES]["min"],
-        )
-        ideal_possible_dmgres = combined - ideal_possible_hp
-
-        ideal_possible_hp, ideal_possible_dmgres = (
-            ideal_possible_hp + self.base_hp,
-            ideal_possible_dmgres + self.base_dmgres,
+    def special_upper(self, combined: Decimal, lows: dict, highs: dict):
+        """Maximum Vitality possible given combined hp/dmgres pool and hp/dmgres ranges"""
+        low_dmgres, high_dmgres = self.limits(Type.DMGRES, lows, highs)
+        low_hp, high_hp = self.limits(Type.HP, lows, highs)
+
+        combined = min(combined, high_dmgres + high_hp)  # Vitality grows with both, the whole pool is spent
+        low_dmgres, high_dmgres = max(low_dmgres, combined - high_hp), min(high_dmgres, combined - low_hp)
+        if low_dmgres > high_dmgres:
+            return None
+        if high_dmgres / Decimal("100") + self.base_dmgres >= 1:
+            return Decimal("Infinity")
+
+        # Vitality along the pool is monotone in dmgres, its maximum sits at either end
+        return max(
+            self.vitality(
+                (combined - dmgres) / Decimal("100") + self.base_hp, dmgres / Decimal("100") + self.base_dmgres
+            )
+            for dmgres in (low_dmgres, high_dmgres)
         )
 
-        return self.vitality(ideal_possible_hp, ideal_possible_dmgres)
-
-    @cache
+    @memoized(SET_FLOORS)
     def floor(self, topping_set: ToppingSet):
         """Minimum combined hp/dmgres pool needed to meet topping set Vitality"""
         obj = self.value(topping_set)
@@ -215,7 +212,7 @@ class Vitality(Special):
 
         min_dmg_res = Decimal(1) - (Decimal(1) / (obj / hp))
 
-        return (min_dmg_res - self.base_dmgres * Decimal(100)).quantize(Decimal(".1"), rounding=ROUND_UP)
+        return (min_dmg_res - self.base_dmgres * Decimal(100)).quantize(Decimal(".1"), rounding=ROUND_FLOOR)
 
     def fancy_value(self, topping_set: ToppingSet):
         return {Type.VITALITY: self.value(topping_set) * 100}
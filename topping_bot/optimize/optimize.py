@@ -1,10 +1,13 @@
+from collections import defaultdict
 from datetime import datetime
-from heapq import nlargest, nsmallest
+from decimal import Decimal
+from heapq import heappush, heapreplace, nlargest, nsmallest
+from itertools import accumulate, count
 from typing import Iterable, List
 
 from tqdm import tqdm
 
-from topping_bot.optimize.toppings import Substats, Topping, ToppingSet, Type
+from topping_bot.optimize.toppings import INFO, SUBSTATS, Substats, Topping, ToppingSet, Type
 from topping_bot.optimize.cutter import Prune, Cutter
 from topping_bot.optimize.objectives import Special
 from topping_bot.optimize.requirements import Requirements
@@ -14,13 +17,25 @@ from topping_bot.util.const import DEBUG
 class Optimizer:
     """Optimizes toppings across multiple cookies"""
 
+    profiled = True
+
     def __init__(self, toppings: List[Topping]):
         self.inventory = toppings
         self.reqs = None
         self.solution = None
         self.cutter = None
         self.toppings = []
+        self.repeats = []
         self.cookies = {}
+        self.dropped = 0
+        self.dominators = 5
+        self.seed = None
+        self.warm = True  # seed solves without one with a greedy set
+        self.listener = None
+        self.depth = 1
+        self.ranked = []
+        self.counter = count()
+        self.stats = None
 
     def select(self, name: str):
         """Select a topping set and remove it from inventory"""
@@ -34,26 +49,142 @@ class Optimizer:
         self.reqs = reqs
         self.reqs.realize(self.cookies)
 
-    def solve(self, reqs: Requirements):
-        """Solves a cookies needed toppings given a set of requirements"""
+    def solve(self, reqs: Requirements, seed: List[Topping] = None):
+        """Solves a cookies needed toppings given a set of requirements, seed is an optional starting set"""
         self.reqs = reqs
         self.reqs.realize(self.cookies)
 
         self.solution = None
+        self.ranked = []
         self.cutter = Cutter(reqs)
+        if self.stats is not None:
+            self.stats.instrument_cutter(self.cutter)
+        self.toppings = self.candidates()
+        self.warm_start(seed)
+
+        start = datetime.now()
+        yield from self.dfs([], 0)
+        self.settle()
+        DEBUG and tqdm.write(f"{reqs.name} : {(datetime.now() - start).total_seconds()}s")
+
+    def set_incumbent(self, candidate: ToppingSet):
+        """Installs candidate as the incumbent and reports it to the listener, if any"""
+        self.solution = candidate
+        if candidate is not None and self.listener is not None:
+            self.listener(candidate)
+
+    def warm_start(self, seed: List[Topping] = None):
+        """Installs a valid seed set, or else a greedy one, as the incumbent so objective pruning starts at the root"""
+        self.seed = None
+        if self.depth > 1:  # a seed would prune sets ranked below it
+            self.set_incumbent(None)
+            return
+
+        if seed is not None and self.valid(seed):
+            self.seed = ToppingSet(list(seed))
+        elif self.warm and (greedy := self.greedy()) is not None and self.valid(greedy):
+            self.seed = ToppingSet(greedy)
+
+        if self.seed is not None:
+            DEBUG and tqdm.write(f"{self.reqs.name} : seeded at {self.reqs.objective.value(self.seed)}")
+        self.set_incumbent(self.seed)
+
+    def valid(self, toppings: List[Topping]):
+        """If five distinct inventory toppings meet every requirement"""
+        if len(toppings) != 5 or len({id(t) for t in toppings}) != 5:
+            return False
+        if any(all(t is not i for i in self.inventory) or t.resonance not in self.reqs.resonance for t in toppings):
+            return False
+
+        return self.reqs.satisfied(ToppingSet(list(toppings)))
+
+    def greedy(self):
+        """Set built by repeatedly adding the candidate closing the most requirement deficit, then best objective"""
+        floors, ceilings = self.reqs.floor_reqs(), self.reqs.ceiling_reqs()
 
+        def score(toppings: List[Topping]):
+            topping_set = ToppingSet(toppings)
+            return (
+                -sum(topping_set.value(r.substat) > r.target for r in ceilings),
+                sum(min(topping_set.value(r.substat) / r.target, 1) if r.target else 1 for r in floors),
+                self.reqs.objective.value(topping_set),
+            )
+
+        combo = []
+        for _ in range(5):
+            remaining = [t for t in self.toppings if all(t is not c for c in combo)]
+            if not remaining:
+                return None
+            combo.append(max(remaining, key=lambda t: score(combo + [t])))
+        return combo
+
+    def candidates(self):
+        """Inventory toppings eligible for the current requirements, presorted for search"""
         # filter out to handle resonant toppings
-        self.toppings = [t for t in self.inventory if t.resonance in reqs.resonance]
+        toppings = [t for t in self.inventory if t.resonance in self.reqs.resonance]
 
         # filter out zero req case
-        self.toppings = [t for t in self.toppings if not any(t.value(zero.substat) for zero in reqs.zero_reqs())]
+        zeros = [substat for substat, zero in zip(SUBSTATS, self.reqs.zero) if zero]
+        toppings = [t for t in toppings if not any(t.value(substat) for substat in zeros)]
 
-        # presort based on objective requirements to promote finding feasible solution sooner
-        self.toppings.sort(key=self.key)
+        # filter out toppings that can always be swapped for a better one
+        reduced = self.reduce(toppings)
+        self.dropped = len(toppings) - len(reduced)
+        DEBUG and tqdm.write(f"{self.reqs.name} : dropped {self.dropped} of {len(toppings)} dominated toppings")
+        if self.stats is not None:
+            self.stats.dropped = self.dropped
+        toppings = reduced
 
-        start = datetime.now()
-        yield from self.dfs([], 0)
-        DEBUG and tqdm.write(f"{reqs.name} : {(datetime.now() - start).total_seconds()}s")
+        # presort based on objective requirements to promote finding feasible solution sooner
+        toppings.sort(key=self.key)
+
+        # identical toppings side by side, the dfs takes the copies of a topping in order
+        toppings = self.group(toppings)
+        self.repeats = [i > 0 and toppings[i] == toppings[i - 1] for i in range(len(toppings))]
+        return toppings
+
+    @staticmethod
+    def group(toppings: List[Topping]):
+        """Moves every copy of a topping right after its first occurrence, identical toppings share a sort key"""
+        copies = defaultdict(list)
+        for topping in toppings:
+            copies[(topping.resonance, tuple(topping.substats))].append(topping)
+        return [topping for members in copies.values() for topping in members]
+
+    def reduce(self, toppings: List[Topping]):
+        """
+        Drops every topping dominated by at least self.dominators others of the same flavor class, five per set solved
+
+        A dominator is no worse on every floor and objective substat, no higher on every ceiling substat and equal on
+        substats bounded both ways, flavor only matters when it can earn a relevant set bonus. Any set holding a
+        dropped topping can swap it for a dominator outside the set, so the optimal value is unchanged
+        """
+        floors = {r.substat for r in self.reqs.floor_reqs()} | set(self.reqs.objective.types)
+        ceilings = {r.substat for r in self.reqs.ceiling_reqs()}
+        higher, lower, equal = floors - ceilings, ceilings - floors, floors & ceilings
+
+        classes = defaultdict(list)
+        for i, topping in enumerate(toppings):
+            flavor = topping.flavor if topping.flavor in floors | ceilings else None
+            profile = [topping.value(s) for s in higher] + [-topping.value(s) for s in lower]
+            classes[(flavor, tuple(topping.value(s) for s in equal))].append((profile, i))
+
+        kept = []
+        for members in classes.values():
+            # any dominator sorts ahead of the toppings it dominates, equal profiles by inventory order
+            members.sort(key=lambda x: (-sum(x[0]), x[1]))
+            for j, (profile, i) in enumerate(members):
+                dominators = 0
+                for other, _ in members[:j]:
+                    if all(a >= b for a, b in zip(other, profile)):
+                        dominators += 1
+                        if dominators == self.dominators:
+                            break
+
+                if dominators < self.dominators:
+                    kept.append(i)
+
+        return [toppings[i] for i in sorted(kept)]
 
     def key(self, topping: Topping):
         if self.reqs.objective.type == Type.VITALITY:
@@ -76,10 +207,39 @@ class Optimizer:
         #     tqdm.write(str(candidate))
         #     tqdm.write(str(self.reqs.objective.value(candidate)))
         #     tqdm.write(str(self.reqs.objective.floor(candidate)))
+        if self.depth > 1:
+            return self.rank(candidate)
         if self.solution is None:
             return candidate
         return max(self.solution, candidate, key=lambda x: self.reqs.objective.value(x))
 
+    def rank(self, candidate: ToppingSet):
+        """
+        Keeps the depth best sets of a ranked solve
+
+        The incumbent is the worst kept set once depth of them are found, so the dfs prunes every subtree that cannot
+        place into the ranking
+        """
+        entry = (self.reqs.objective.value(candidate), -next(self.counter), candidate)  # ties rank by discovery
+
+        if len(self.ranked) < self.depth:
+            heappush(self.ranked, entry)
+        elif entry > self.ranked[0]:
+            heapreplace(self.ranked, entry)
+        else:
+            return self.solution
+
+        return self.ranked[0][2] if len(self.ranked) == self.depth else None
+
+    def ranking(self):
+        """Kept sets of a ranked solve with their objective value, best first"""
+        return [(value, candidate) for value, _, candidate in sorted(self.ranked, reverse=True)]
+
+    def settle(self):
+        """Ends a ranked solve on its best set"""
+        if self.depth > 1 and self.ranked:
+            self.set_incumbent(max(self.ranked)[2])
+
     def dfs(self, combo: List[Topping], idx):
         """Dfs combination generator, dfs so a benchmark solution is found as soon as possible"""
         if len(combo) == 1:
@@ -89,13 +249,16 @@ class Optimizer:
             # tqdm.write(f"PRUNE : {reason} : {[str(topping) for topping in combo]}")
             return reason
         if len(combo) == 5:
-            self.solution = self.best_objective(ToppingSet(combo))
+            if (candidate := self.best_objective(ToppingSet(combo))) is not self.solution:
+                self.set_incumbent(candidate)
             return
         if idx == len(self.toppings):
             return
 
         planes = self.cutter.init_planes()
         for i in range(idx, len(self.toppings)):
+            if i > idx and self.repeats[i]:  # an identical copy already led this slot, its sets were all searched
+                continue
             if self.cutter.cut_topping(self.toppings[i], planes):
                 continue
 
@@ -110,6 +273,14 @@ class Optimizer:
         """Prune a combination subtree from consideration if it is unfavorable"""
         failures = Prune.NONE
 
+        if len(combo) == 5:  # full set, one pass over the compiled requirement bounds
+            floor_failures, ceil_failures = self.reqs.violations(ToppingSet(combo))
+            if floor_failures:
+                failures |= Prune.FLOOR_FAILURE
+            if ceil_failures:
+                failures |= Prune.CEILING_FAILURE
+            return failures, floor_failures, ceil_failures, 0
+
         floor_failures = []
         overall_set_requirements = {}
         for r in self.reqs.floor_reqs():  # valid floor check
@@ -165,30 +336,15 @@ class Optimizer:
             if isinstance(self.reqs.objective, Special):
                 overall_set_requirements.pop(self.reqs.objective.types, None)
 
-                obj_value_met = False
-                for full_set in self.obj_special_case(combo, toppings, overall_set_requirements):
-                    combined = full_set.value(self.reqs.objective.types)  # partial informed special obj check
-                    if combined > 0 and self.reqs.objective.special_upper(
-                        combined, full_set, combo
-                    ) > self.reqs.objective.value(self.solution):
-                        obj_value_met = True
-                        break
+                value = self.reqs.objective.value(self.solution)
+                valid_floor = sum(self.reqs.floor(s) for s in self.reqs.valid_substats)
+                obj_value_met, all_value_met = self.special_check(
+                    self.special_case(combo, toppings, overall_set_requirements, valid_floor), value
+                )
 
-                if not obj_value_met:
+                if not obj_value_met:  # partial informed special obj check
                     failures |= Prune.COMBINED_SPECIAL_OBJ_FAILURE
-
-                all_value_met = False
-                for full_set in self.all_special_case(combo, toppings, overall_set_requirements):
-                    combined = full_set.value(self.reqs.all_substats) - sum(  # partial informed special all check
-                        self.reqs.floor(s) for s in self.reqs.valid_substats
-                    )
-                    if combined > 0 and self.reqs.objective.special_upper(
-                        combined, full_set, combo
-                    ) > self.reqs.objective.value(self.solution):
-                        all_value_met = True
-                        break
-
-                if not all_value_met:
+                if not all_value_met:  # partial informed special all check
                     failures |= Prune.COMBINED_SPECIAL_ALL_FAILURE
 
         return failures, floor_failures, ceil_failures, non_objective_count
@@ -237,9 +393,9 @@ class Optimizer:
 
     def objective_case(self, combo: List[Topping], toppings: List[Topping]):
         for potential_req_count, potential_set in self.floor_case(combo, toppings, self.reqs.objective.types):
-            unmatched_count = 5 - potential_req_count
+            unmatched_count = 5 - len(combo) - potential_req_count
             potential_value = sum(potential_set.raw(s) for s in self.reqs.objective.types)
-            potential_value += self.reqs.best_possible_set_effect(combo, self.reqs.objective.types, 5 - unmatched_count)
+            potential_value += self.reqs.best_possible_set_effect(combo, self.reqs.objective.types, unmatched_count)
             yield potential_req_count, potential_value, potential_set
 
     def combined_case(self, combo: List[Topping], toppings: List[Topping], substats: Substats, set_reqs: dict = None):
@@ -289,42 +445,90 @@ class Optimizer:
                 - self.reqs.objective.floor(self.solution)
             )
 
-    def sum_to_n(self, n, size):
-        if size == 1:
-            yield [n]
+    def special_check(self, bounds: Iterable, value):
+        """If some split bounds the special objective above value, from the objective pool and from the all pool"""
+        objective = self.reqs.objective
+        obj_value_met = all_value_met = False
+        for lows, highs, obj_pool, all_pool in bounds:
+            if not obj_value_met and obj_pool > 0:
+                upper = objective.special_upper(obj_pool, lows, highs)
+                obj_value_met = upper is not None and upper > value
+            if not all_value_met and all_pool > 0:
+                upper = objective.special_upper(all_pool, lows, highs)
+                all_value_met = upper is not None and upper > value
+            if obj_value_met and all_value_met:
+                break
+        return obj_value_met, all_value_met
+
+    def special_functions(self):
+        """Values the special bounds draw on, each objective substat, the objective pool and the all pool"""
+        return [*self.reqs.objective.types, self.reqs.objective.types, self.reqs.all_substats]
+
+    def special_flavors(self, set_reqs: dict):
+        """Flavors split off into their own group of the open slots, the objective ones and those floors require"""
+        types = self.reqs.objective.types
+        return tuple(types) + tuple(s for s, count in set_reqs.items() if count and s not in types)
+
+    def special_case(self, combo: List[Topping], toppings: List[Topping], set_reqs: dict, valid_floor):
+        """Special objective bounds of every split of the open slots over the flavor groups"""
+        n, functions, flavors = 5 - len(combo), self.special_functions(), self.special_flavors(set_reqs)
+
+        groups = []
+        for flavor in flavors:
+            pool = [topping for topping in toppings if topping.flavor == flavor]
+            groups.append([list(accumulate(nlargest(n, (t.value(f) for t in pool)), initial=0)) for f in functions])
+        pool = [topping for topping in toppings if topping.flavor not in flavors]
+        groups.append([list(accumulate(nlargest(n, (t.value(f) for t in pool)), initial=0)) for f in functions])
+
+        raws = [sum(topping.value(f) for topping in combo) for f in functions]
+        counts = {s: sum(1 for topping in combo if topping.flavor == s) for s in self.reqs.all_substats}
+        yield from self.special_bounds(n, flavors, groups, set_reqs, raws, counts, valid_floor)
+
+    def special_bounds(
+        self, n: int, flavors: tuple, groups: list, set_reqs: dict, raws: list, counts: dict, valid_floor
+    ):
+        """
+        Objective substat ranges, objective pool and all pool of every split of the open slots, in percent
+
+        groups hold the prefix sums of the best toppings of each flavor group under every special function, the last
+        group holding every other flavor. A split fixes the flavor counts and so the set bonuses each group reaches, so
+        every objective substat, the objective pool and the all pool are bounded by the best toppings of each group
+        """
+        types = self.reqs.objective.types
+        k = len(types)
+
+        lows = {s: self.scaled(raws[i] + self.set_bonus(s, counts[s])) for i, s in enumerate(types)}
+        group = {s: flavors.index(s) if s in flavors else -1 for s in self.reqs.all_substats}
+        minimums = [set_reqs.get(flavor, 0) for flavor in flavors] + [0]
+        maxima = [len(prefixes[0]) - 1 for prefixes in groups]
+        for split in self.splits(n, minimums, maxima):
+            bonuses = {s: self.set_bonus(s, counts[s] + split[g]) for s, g in group.items()}
+            totals = [raw + sum(prefixes[f][m] for prefixes, m in zip(groups, split)) for f, raw in enumerate(raws)]
+
+            highs = {s: self.scaled(totals[i] + bonuses[s]) for i, s in enumerate(types)}
+            obj_pool = self.scaled(totals[k] + sum(bonuses[s] for s in types))
+            all_pool = self.scaled(totals[k + 1] + sum(bonuses.values())) - valid_floor
+            yield lows, highs, obj_pool, all_pool
+
+    def splits(self, n: int, minimums: List[int], maxima: List[int]):
+        """Every way to take n toppings over the groups, between the minimum and maximum of each group"""
+        if len(minimums) == 1:
+            if minimums[0] <= n <= maxima[0]:
+                yield (n,)
             return
 
-        for i in range(0, n + 1):
-            for tail in self.sum_to_n(n - i, size - 1):
-                yield [i] + tail
-
-    def special_case(self, combo: List[Topping], toppings: List[Topping], substats: Substats, set_reqs: dict = None):
-        if set_reqs is not None:
-            combo = self.fill_out_combo(combo, toppings, substats, set_reqs)
-            if combo is None:
-                return
-
-        if len(combo) != 5:
-            remaining_set = set(toppings).difference(set(combo))
-
-            n = 5 - len(combo)
-            pools = [
-                self.floor_pool(n, (topping for topping in remaining_set if topping.flavor == s), substats)
-                for s in self.reqs.objective.types
-            ]
-
-            for partitions in self.sum_to_n(n, len(pools)):
-                potential_set = combo.copy()
-                for i, partition in enumerate(partitions):
-                    potential_set += pools[i][:partition]
-
-                if len(potential_set) == 5:
-                    yield ToppingSet(potential_set)
-        else:
-            yield ToppingSet(combo)
-
-    def obj_special_case(self, combo: List[Topping], toppings: List[Topping], set_reqs: dict):
-        yield from self.special_case(combo, toppings, self.reqs.objective.types, set_reqs)
-
-    def all_special_case(self, combo: List[Topping], toppings: List[Topping], set_reqs: dict):
-        yield from self.special_case(combo, toppings, self.reqs.all_substats, set_reqs)
+        for m in range(minimums[0], min(n, maxima[0]) + 1):
+            for tail in self.splits(n - m, minimums[1:], maxima[1:]):
+                yield (m,) + tail
+
+    @staticmethod
+    def set_bonus(substat: Type, count: int):
+        for required_count, set_bonus in INFO[substat]["combos"][::-1]:
+            if count >= required_count:
+                return set_bonus
+        return Decimal(0)
+
+    @staticmethod
+    def scaled(value):
+        """Value in percent"""
+        return value
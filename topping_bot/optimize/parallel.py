@@ -0,0 +1,131 @@
+import os
+from multiprocessing import Pool, TimeoutError
+from multiprocessing.sharedctypes import Array
+from typing import List
+
+from topping_bot.optimize.cutter import Prune
+from topping_bot.optimize.fixed import FixedOptimizer, SearchState
+from topping_bot.optimize.requirements import Requirements
+from topping_bot.optimize.toppings import Topping
+
+SYNC_INTERVAL = 64  # prune calls between incumbent syncs
+POLL_INTERVAL = 1  # seconds between merges of live branch incumbents
+
+_OPTIMIZER = None
+_PARENT = None
+
+
+def init_worker(optimizer: "ParallelOptimizer", incumbents):
+    global _OPTIMIZER, _PARENT
+    optimizer.incumbents = incumbents
+    _OPTIMIZER, _PARENT = optimizer, os.getppid()
+
+
+def solve_branch(branch: int):
+    return _OPTIMIZER.solve_branch(branch)
+
+
+class ParallelOptimizer(FixedOptimizer):
+    """
+    Fixed-point optimizer splitting the top level dfs branches across a process pool
+
+    Branch b holds every set whose first topping is toppings[b]. Workers publish their branch incumbent to a shared
+    array and prune against the best incumbent of every lower branch, lower branches win objective ties when merging
+    so the chosen set does not depend on scheduling
+    """
+
+    profiled = False  # branches are searched in pool workers, out of reach of the solve process stats
+
+    def __init__(self, toppings: List[Topping], processes: int = None):
+        super().__init__(toppings)
+        self.processes = processes or os.cpu_count()
+        self.incumbents = None
+        self.branch = None
+        self.synced = {}
+        self.calls = 0
+
+    def solve(self, reqs: Requirements, seed: List[Topping] = None):
+        """
+        Solves a cookies needed toppings given a set of requirements, yields once per finished branch
+
+        Polls without a finished branch yield None so the solve can be stopped mid branch, closing the solve
+        terminates the pool
+        """
+        if self.depth > 1:  # branch incumbents hold a single set, ranked solves run in process
+            yield from super().solve(reqs, seed)
+            return
+
+        self.start(reqs, seed)
+        self.branch = None
+
+        if self.prune([], 0)[0] != Prune.NONE:
+            return
+
+        self.incumbents = Array("i", [-1] * (5 * len(self.toppings)), lock=False)
+        try:
+            with Pool(self.processes, initializer=init_worker, initargs=(self, self.incumbents)) as pool:
+                leads = [branch for branch in range(len(self.toppings)) if not self.repeats[branch]]
+                branches = pool.imap_unordered(solve_branch, leads)
+                while True:
+                    try:
+                        branch = branches.next(timeout=POLL_INTERVAL)
+                    except TimeoutError:
+                        if self.listener is not None:  # no branch finished, surface the best incumbent so far
+                            self.merge()
+                        yield None
+                        continue
+                    except StopIteration:
+                        break
+                    yield self.toppings[branch]
+        finally:
+            self.merge()
+
+    def merge(self):
+        """Deterministically merges branch incumbents, on ties the seed and then the lowest branch is kept"""
+        self.set_incumbent(self.seed)
+        incumbents = self.incumbents[:]
+        for branch in range(len(self.toppings)):
+            combo = incumbents[5 * branch : 5 * branch + 5]
+            if combo[0] != -1 and self.valid([self.toppings[i] for i in combo]):  # skip torn writes of live workers
+                self.update_solution(combo)
+
+    def solve_branch(self, branch: int):
+        """Searches every set starting with toppings[branch], run inside a pool worker"""
+        self.branch = branch
+        self.synced = {}
+        self.listener = None  # only the solve process reports incumbents
+        self.set_incumbent(self.seed)
+        self.sync()
+
+        self.state = SearchState(self.vectors, self.flavors)
+        self.state.push(branch)
+        for _ in self.dfs([branch], branch + 1):
+            pass
+        return branch
+
+    def update_solution(self, combo: List[int]):
+        if not super().update_solution(combo):
+            return False
+
+        if self.branch is not None:  # publish own branch incumbent
+            self.incumbents[5 * self.branch : 5 * self.branch + 5] = combo
+        return True
+
+    def sync(self):
+        """Installs the best incumbent of the lower branches without publishing it as our own"""
+        if os.getppid() != _PARENT:  # solve process was terminated, stop the orphaned branch
+            raise SystemExit
+        incumbents = self.incumbents[: 5 * self.branch]
+        for branch in range(self.branch):
+            combo = incumbents[5 * branch : 5 * branch + 5]
+            if combo[0] != -1 and self.synced.get(branch) != combo:
+                self.synced[branch] = combo
+                if self.valid([self.toppings[i] for i in combo]):  # skip torn writes of live workers
+                    super().update_solution(combo)
+
+    def prune(self, combo: List[int], idx):
+        if self.branch is not None:
+            self.calls += 1
+            if self.calls % SYNC_INTERVAL == 0:
+                self.sync()
+        return super().prune(combo, idx)
@@ -1,16 +1,31 @@
 import csv
 import traceback
+from collections import deque
 from enum import Enum
+from math import ceil
+from multiprocessing import TimeoutError, get_context
 from pathlib import Path
-from typing import Iterable, List
+from queue import Full, Queue
+from threading import Event, Thread
+from typing import Iterable, List, NamedTuple, Tuple
 
 import cv2
 import numpy as np
 
+from topping_bot.optimize.store import read_store, store_path, write_store
 from topping_bot.optimize.toppings import INFO, Resonance, Topping
 from topping_bot.util.const import DEBUG_PATH, STATIC_PATH
 
 RESONANCE_THRESHOLD = 0.3
+FRAMES_PER_WORKER = 4  # frames queued per recognition worker
+CARD_HASH_SCALE = 4  # downscale of the binarized card regions hashed before reading a card
+CARD_HASH_TOLERANCE = 8  # differing hash bits still taken as the same card, a changed digit flips over 30
+CARD_CACHE = 64  # cards remembered by hash for videos scrolling back
+CARD_TIMEOUT = 30  # seconds to wait on a worker reading a card before giving up on the video
+MIN_HOLD = 1 / 15  # seconds a topping card stays on screen at the least
+MAX_FPS = 120  # higher reported frame rates are taken as unknown, variable rate and webm files can report 1000
+SIGNATURE_SCALE = 8  # downscale of frame signatures
+SIGNATURE_SHARE = 1 / 32  # share of the unique frame threshold under which signatures count as unchanged
 KERNEL = np.ones((2, 2), np.uint8)
 READER_PATH = STATIC_PATH / "reader"
 TEMPLATES = {
@@ -22,6 +37,40 @@ TEMPLATES = {
 }
 
 
+class TemplateBank:
+    """
+    Templates of one kind scored together against a crop, in TEMPLATES order so ties pick the same template
+
+    Template sizes are held in arrays so a crop rules out every template that cannot line up with it in one
+    comparison, only the rest are matched
+    """
+
+    def __init__(self, templates: dict):
+        self.keys = list(templates)
+        self.templates = list(templates.values())
+        self.heights = np.array([template.shape[0] for template in self.templates])
+        self.widths = np.array([template.shape[1] for template in self.templates])
+
+    def locate(self, source: np.ndarray, top_left, bot_right, debug=False):
+        """
+        Template with the least image_diff, the first one when none lines up
+
+        A match only lines up when both its edges are within reach of the active pixels, which bounds the template
+        size, templates outside those bounds always score inf and are skipped
+        """
+        height, width = bot_right - top_left
+        fits = (np.abs(self.heights - height) <= 20) & (np.abs(self.widths - width) <= 40)
+
+        best, best_error = self.keys[0], float("inf")
+        for k in np.flatnonzero(fits):
+            if (error := image_diff(source, self.templates[k], top_left, bot_right, debug)) < best_error:
+                best, best_error = self.keys[k], error
+        return best
+
+
+BANKS = {kind: TemplateBank(TEMPLATES[kind]) for kind in ("flavor", "substat")}
+
+
 def nothing(x):
     pass
 
@@ -56,15 +105,26 @@ def roi_selector(input_frame):
 
 
 def read_toppings(fp: Path) -> List[Topping]:
+    """Inventory toppings, read from the feature store when it is up to date with the csv"""
+    if (toppings := read_store(fp)) is not None:
+        return toppings
+
     toppings = []
     with open(fp) as f:
         reader = csv.reader(f)
-        for row in reader:
-            toppings.append(Topping([eval(substat) for substat in row[1:-1]], resonance=Resonance(row[-1])))
+        for i, row in enumerate(reader):
+            toppings.append(Topping([eval(substat) for substat in row[1:-1]], resonance=Resonance(row[-1]), index=i))
     return toppings
 
 
 def write_toppings(toppings: Iterable[Topping], fp: Path, append=False):
+    """Writes the inventory csv and rebuilds its feature store"""
+    toppings = list(toppings)
+    if append and fp.exists():
+        existing = read_toppings(fp)
+    else:
+        existing = []
+
     mode = "w" if not append else "a"
     with open(fp, mode=mode, newline="") as f:
         writer = csv.writer(f)
@@ -74,6 +134,13 @@ def write_toppings(toppings: Iterable[Topping], fp: Path, append=False):
                 + [(substat.value, str(value)) for substat, value in topping.substats]
                 + [topping.resonance.value]
             )
+    write_store(fp, existing + toppings)
+
+
+def remove_toppings(fp: Path):
+    """Deletes the inventory csv along with its feature store"""
+    fp.unlink(missing_ok=True)
+    store_path(fp).unlink(missing_ok=True)
 
 
 def image_diff(source: np.ndarray, template: np.ndarray, top_left, bot_right, debug=False):
@@ -99,9 +166,7 @@ def image_to_substat(source: np.ndarray, template, debug=False):
     top_left = np.min(active_pixels, axis=1).astype(np.int32)
     bot_right = np.max(active_pixels, axis=1).astype(np.int32)
 
-    return fp_to_type(
-        min(TEMPLATES[template], key=lambda x: image_diff(source, TEMPLATES[template][x], top_left, bot_right, debug))
-    )
+    return fp_to_type(BANKS[template].locate(source, top_left, bot_right, debug))
 
 
 def image_to_decimal(source: np.ndarray):
@@ -163,15 +228,33 @@ def detect_blur(image, size=60, thresh=10):
     return mean <= thresh
 
 
+def signature(partial_frame: np.ndarray):
+    """Downscaled grayscale thumbnail of a frame region, a cheap stand-in for comparing the region itself"""
+    y, x, c = partial_frame.shape
+    gray = cv2.cvtColor(partial_frame, cv2.COLOR_BGR2GRAY)
+    return cv2.resize(gray, (x // SIGNATURE_SCALE, y // SIGNATURE_SCALE), interpolation=cv2.INTER_AREA)
+
+
 def extract_unique_frames(fp: Path):
+    """
+    Frames of a video whose lower card region changed since the last one yielded, or the image itself
+
+    Frames whose signature barely moved since the last yielded one are dropped without the full comparison. While the
+    signature holds still between samples, frames are skipped with grab and never decoded, at most MIN_HOLD seconds
+    of them so no topping card shown for longer is skipped over
+    """
     video = cv2.VideoCapture(str(fp))
     for _ in range(2):
         success, frame = video.read()
     is_video = success
 
     video = cv2.VideoCapture(str(fp))
+    fps = video.get(cv2.CAP_PROP_FPS)
+    max_stride = max(int(fps * MIN_HOLD), 1) if 0 < fps <= MAX_FPS else 1
 
     last_partial_frame = None
+    last_signature = kept_signature = None
+    stride = 1
     success, frame = video.read()
     y, x, c = frame.shape
     while success:
@@ -182,6 +265,7 @@ def extract_unique_frames(fp: Path):
         # crop left half
         frame = frame[:, : x // 2]
         partial_frame = frame[y // 2 : -(y // 4)]
+        current = signature(partial_frame)
 
         # will have to be revisited, this bugs out
         # if detect_blur(cv2.cvtColor(partial_frame, cv2.COLOR_BGR2GRAY), thresh=10):
@@ -191,22 +275,99 @@ def extract_unique_frames(fp: Path):
         if last_partial_frame is None:
             new_y, new_x, new_c = partial_frame.shape
             threshold = new_y * new_x // 200
-            last_partial_frame = partial_frame
+            last_partial_frame, kept_signature = partial_frame, current
             yield frame, is_video
-        elif cv2.norm(last_partial_frame, partial_frame, cv2.NORM_L2) > threshold:
-            last_partial_frame = partial_frame
+        elif (
+            cv2.norm(kept_signature, current, cv2.NORM_L2) > threshold * SIGNATURE_SHARE
+            and cv2.norm(last_partial_frame, partial_frame, cv2.NORM_L2) > threshold
+        ):
+            last_partial_frame, kept_signature = partial_frame, current
             yield frame, is_video
+
+        # skip ahead while the card holds still, step frame by frame while it scrolls
+        if last_signature is not None and cv2.norm(last_signature, current, cv2.NORM_L2) <= threshold * SIGNATURE_SHARE:
+            stride = min(stride * 2, max_stride)
+        else:
+            stride = 1
+        last_signature = current
+
+        for _ in range(stride - 1):
+            video.grab()
         success, frame = video.read()
 
     video.release()
 
 
-def extract_topping_data(unique_frames: Iterable[np.ndarray], debug=False, verbose=False):
+def prefetch(iterable: Iterable, size: int):
+    """Runs iterable in a background thread up to size items ahead of the consumer, its exceptions are raised here"""
+    items, stop = Queue(size), Event()
+
+    def offer(entry):
+        while not stop.is_set():
+            try:
+                items.put(entry, timeout=0.1)
+                return True
+            except Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not offer((True, item)):
+                    return
+            offer((False, None))
+        except Exception as e:
+            offer((False, e))
+
+    Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            more, item = items.get()
+            if not more:
+                if item is not None:
+                    raise item
+                return
+            yield item
+    finally:
+        stop.set()
+
+
+def recognize(frames: Iterable[np.ndarray], plan: "CardPlan", workers: int, cards: "CardCache"):
+    """
+    read_card of every frame across a pool of workers, in frame order and at most a few frames per worker ahead
+
+    Frames are hashed before they are sent out, a card already read or still being read is not read again
+    """
+    with get_context("spawn").Pool(workers) as pool:  # frames may come from a decoder thread, never fork under it
+        pending = deque()
+        for frame in frames:
+            bits = card_hash(frame, plan)
+            if (job := cards.find(bits)) is None:
+                job = pool.apply_async(read_card, (frame, plan))
+                cards.remember(bits, job)
+            pending.append((frame, bits, job))
+            if len(pending) > FRAMES_PER_WORKER * workers:
+                yield cards.result(*pending.popleft(), plan, pool)
+        while pending:
+            yield cards.result(*pending.popleft(), plan, pool)
+
+
+def extract_topping_data(unique_frames: Iterable[np.ndarray], debug=False, verbose=False, workers=1):
+    """
+    Toppings shown in the unique frames, skipping repeats of the last one
+
+    The card is located on every frame until the first topping is read and kept for the rest of the video, so with
+    more than one worker the frames after it are read in parallel. Cards are recognized by card_hash first, only
+    frames showing a card that was not read recently go through the template matching
+    """
     cv2.destroyAllWindows()
 
     last_topping = None
-    bounding_rectangle = None
-    for i, (frame, is_video) in enumerate(unique_frames):
+    plan = None
+    cards = CardCache()
+    unique_frames = iter(unique_frames)
+    for frame, is_video in unique_frames:
         if not is_video and (result := extract_multiupgrade_topping_data(frame)) is not None:
             yield result
             return
@@ -215,92 +376,217 @@ def extract_topping_data(unique_frames: Iterable[np.ndarray], debug=False, verbo
             frame = frame[:, : x // 2]
 
         if last_topping is None:
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            threshold = cv2.threshold(gray, 215, 255, cv2.THRESH_BINARY)[1]
-
-            contours, hierarchies = cv2.findContours(threshold, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
-            if not contours:
+            if (rectangle := locate_card(frame)) is None:
                 continue
-            contour = max(contours, key=lambda x: cv2.contourArea(x))
+            plan = plan_card(rectangle)
 
-            if cv2.contourArea(contour) <= 10_000:
-                continue
-            bounding_rectangle = cv2.boundingRect(contour)
+        if (topping := cards.find(bits := card_hash(frame, plan))) is None:
+            if topping := read_card(frame, plan):
+                cards.remember(bits, topping)
 
-        x, y, w, h = bounding_rectangle
-        frame = frame[y : y + h, x : x + w]
+        if topping is False:
+            return
+        elif topping is None:
+            continue
+        elif last_topping is None or topping != last_topping:
+            last_topping = topping
+            yield topping
 
-        y, x, c = frame.shape
-        scale_factor = 1400 / y
-        frame = cv2.resize(frame, None, fx=scale_factor, fy=scale_factor, interpolation=cv2.INTER_CUBIC)
+        if workers > 1:
+            break
+    else:
+        return
 
-        y, x, c = frame.shape
-        if x < 1780:
-            continue
+    for topping in recognize((frame for frame, _ in unique_frames), plan, workers, cards):
+        if topping is False:
+            return
+        elif topping is not None and topping != last_topping:
+            last_topping = topping
+            yield topping
 
-        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        threshold, frame = cv2.threshold(frame, 180, 255, cv2.THRESH_BINARY)
 
-        topping_info = frame[750:1220, 140:]
+def locate_card(frame: np.ndarray):
+    """Bounding rectangle of the topping card, the largest bright contour of the frame"""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    threshold = cv2.threshold(gray, 215, 255, cv2.THRESH_BINARY)[1]
 
-        main = frame[740:847]
-        flavor, value = image_to_substat(main[:, :1430], "flavor"), image_to_decimal(main[:, 1430:])
-        if flavor is None or value is None or value == "0":
-            continue
+    contours, hierarchies = cv2.findContours(threshold, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return None
+    contour = max(contours, key=lambda x: cv2.contourArea(x))
 
-        substats = [(flavor, value)]
-        substats_info = topping_info[140:]
+    if cv2.contourArea(contour) <= 10_000:
+        return None
+    return cv2.boundingRect(contour)
 
-        for j in range(3):
-            line = substats_info[125 * j : 125 * j + 80]
-            substat, value = image_to_substat(line[:, 10:1345], "substat"), image_to_decimal(line[:, 1345:])
 
-            if substat is None or value is None:
-                continue
+class CardPlan(NamedTuple):
+    """Where the topping card sits in the frames of a video and its scale onto the 1400 px high card it is read on"""
 
-            substats.append((substat, value))
+    rectangle: Tuple[int, int, int, int]
+    scale: float
+    width: int
 
-        # Resonance check
-        if substats:
-            resonant_indicator_roi = frame[235:315, 1070:1160]
 
-            h, w = resonant_indicator_roi.shape
-            if np.count_nonzero(resonant_indicator_roi == 0) / (h * w) < 0.5:
-                metatype = Resonance.NORMAL
-            else:
-                # metatype check
-                title = frame[100:225, 200:-200]
+def plan_card(rectangle) -> CardPlan:
+    """Card plan of the bounding rectangle of a card, computed once per video"""
+    x, y, w, h = rectangle
+    scale = 1400 / h
+    return CardPlan(rectangle, scale, round(w * scale))
 
-                active_pixels = np.stack(np.where(title == 0))
-                if active_pixels.size == 0:
-                    return None
 
-                # to capture new resonance template
-                # cv2.imwrite(str(READER_PATH / "resonant" / "new.jpg"), title)
+def card_region(frame: np.ndarray, plan: CardPlan, top: int, bottom: int, left: int = 0, right: int = None):
+    """
+    Binarized rows top:bottom and columns left:right of the scaled card, resampled from the frame for those alone
 
-                metatype = None
-                metatype_error = float("inf")
-                for resonance in [resonance for resonance in Resonance if resonance != Resonance.NORMAL]:
-                    template = TEMPLATES["resonant"][resonance.value.lower().replace(" ", "_")]
-                    h, w = template.shape
+    Pixel p of the scaled card samples the card at (p + 0.5) / scale - 0.5 like cv2.resize, edges replicate the card
+    """
+    x, y, w, h = plan.rectangle
+    right = plan.width if right is None else right
+    inverse = 1 / plan.scale
 
-                    result = cv2.matchTemplate(title, template, cv2.TM_SQDIFF)
-                    min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
+    transform = np.float64([[inverse, 0, (left + 0.5) * inverse - 0.5], [0, inverse, (top + 0.5) * inverse - 0.5]])
+    region = cv2.warpAffine(
+        frame[y : y + h, x : x + w],
+        transform,
+        (right - left, bottom - top),
+        flags=cv2.INTER_CUBIC | cv2.WARP_INVERSE_MAP,
+        borderMode=cv2.BORDER_REPLICATE,
+    )
 
-                    x, y = min_loc
+    region = cv2.cvtColor(region, cv2.COLOR_BGR2GRAY)
+    return cv2.threshold(region, 180, 255, cv2.THRESH_BINARY)[1]
+
+
+def card_hash(frame: np.ndarray, plan: CardPlan) -> np.ndarray:
+    """
+    Perceptual hash of the card on a frame, its binarized title and info regions at one bit per CARD_HASH_SCALE square
+    of the scaled card
+
+    The regions are binarized at the resolution of the frame instead of being scaled up first, so a hash costs a small
+    share of read_card
+    """
+    x, y, w, h = plan.rectangle
+    bits = []
+    for top, bottom, left, right in ((100, 315, 200, plan.width - 200), (750, 1220, 140, plan.width)):
+        region = frame[
+            y + int(top / plan.scale) : y + ceil(bottom / plan.scale),
+            x + int(left / plan.scale) : x + min(ceil(right / plan.scale), w),
+        ]
+        region = cv2.threshold(cv2.cvtColor(region, cv2.COLOR_BGR2GRAY), 180, 255, cv2.THRESH_BINARY)[1]
+        size = ((right - left) // CARD_HASH_SCALE, (bottom - top) // CARD_HASH_SCALE)
+        bits.append(cv2.resize(region, size, interpolation=cv2.INTER_AREA).ravel() > 127)
+    return np.concatenate(bits)
+
+
+class CardCache:
+    """
+    Results of reading the cards shown last, found by their card_hash within CARD_HASH_TOLERANCE bits
+
+    A result is a topping or the pending result of a worker reading the card, the least recently shown card is
+    forgotten first. Like the serial reads, only cards read into a topping stay remembered
+    """
+
+    def __init__(self, size: int = CARD_CACHE):
+        self.size = size
+        self.cards = []
+
+    def find(self, bits: np.ndarray):
+        for i in range(len(self.cards) - 1, -1, -1):
+            if np.count_nonzero(self.cards[i][0] != bits) <= CARD_HASH_TOLERANCE:
+                self.cards.append(self.cards.pop(i))
+                return self.cards[-1][1]
+        return None
 
-                    if (
-                        error := cv2.norm(title[y : y + h, x : x + w], template, cv2.NORM_L1) / (h * w)
-                    ) < metatype_error:
-                        metatype = resonance
-                        metatype_error = error
+    def remember(self, bits: np.ndarray, result):
+        self.cards.append((bits, result))
+        if len(self.cards) > self.size:
+            self.cards.pop(0)
+
+    def result(self, frame: np.ndarray, bits: np.ndarray, result, plan: "CardPlan", pool):
+        """
+        Topping of a frame, waiting on the worker still reading its card
+
+        The first frame of a card settles its remembered result, repeats of a card that could not be read are read
+        again on their own as the serial reads would. A worker stuck on a card stops the pool and fails the read
+        """
+        if isinstance(result, Topping):
+            return result
+
+        try:
+            topping = result.get(timeout=CARD_TIMEOUT)
+        except TimeoutError:
+            pool.terminate()
+            raise ValueError(f"A topping card took over {CARD_TIMEOUT} seconds to read, please try the video again")
+        for i, (card_bits, card_result) in enumerate(self.cards):
+            if card_result is result:
+                if topping:
+                    self.cards[i] = (card_bits, topping)
+                else:
+                    self.cards.pop(i)
+                return topping
+
+        if topping is None and (topping := read_card(frame, plan)):
+            self.remember(bits, topping)
+        return topping
+
+
+def read_card(frame: np.ndarray, plan: CardPlan):
+    """Topping on the card of a frame, None when it cannot be read and False when the video should not be read on"""
+    if plan.width < 1780:
+        return None
 
-            topping = Topping(substats, resonance=metatype)
-            if not topping.validate():
-                continue
-            elif last_topping is None or topping != last_topping:
-                last_topping = topping
-                yield topping
+    main = card_region(frame, plan, 740, 847)
+    flavor, value = image_to_substat(main[:, :1430], "flavor"), image_to_decimal(main[:, 1430:])
+    if flavor is None or value is None or value == "0":
+        return None
+
+    substats = [(flavor, value)]
+    for j in range(3):
+        line = card_region(frame, plan, 890 + 125 * j, 970 + 125 * j, 140)
+        substat, value = image_to_substat(line[:, 10:1345], "substat"), image_to_decimal(line[:, 1345:])
+
+        if substat is None or value is None:
+            continue
+
+        substats.append((substat, value))
+
+    # Resonance check
+    resonant_indicator_roi = card_region(frame, plan, 235, 315, 1070, 1160)
+
+    h, w = resonant_indicator_roi.shape
+    if np.count_nonzero(resonant_indicator_roi == 0) / (h * w) < 0.5:
+        metatype = Resonance.NORMAL
+    else:
+        # metatype check
+        title = card_region(frame, plan, 100, 225, 200, plan.width - 200)
+
+        active_pixels = np.stack(np.where(title == 0))
+        if active_pixels.size == 0:
+            return False
+
+        # to capture new resonance template
+        # cv2.imwrite(str(READER_PATH / "resonant" / "new.jpg"), title)
+
+        metatype = None
+        metatype_error = float("inf")
+        for resonance in [resonance for resonance in Resonance if resonance != Resonance.NORMAL]:
+            template = TEMPLATES["resonant"][resonance.value.lower().replace(" ", "_")]
+            h, w = template.shape
+
+            result = cv2.matchTemplate(title, template, cv2.TM_SQDIFF)
+            min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
+
+            x, y = min_loc
+
+            if (error := cv2.norm(title[y : y + h, x : x + w], template, cv2.NORM_L1) / (h * w)) < metatype_error:
+                metatype = resonance
+                metatype_error = error
+
+    topping = Topping(substats, resonance=metatype)
+    if not topping.validate():
+        return None
+    return topping
 
 
 def extract_multiupgrade_topping_data(frame: np.ndarray):
@@ -1,13 +1,12 @@
 from collections import defaultdict
 from decimal import Decimal
-from functools import cache
 from typing import Any, List, Tuple
 
 import yaml
 from yaml import BaseLoader
 
 from topping_bot.crk.cookies import Cookie
-from topping_bot.optimize.toppings import INFO, Resonance, Topping, Type
+from topping_bot.optimize.toppings import INDEX, INFO, SUBSTATS, Resonance, Topping, ToppingSet, Type
 from topping_bot.optimize.objectives import Special, Combo, EDMG, Vitality, Objective
 from topping_bot.optimize.validity import Normal, Range, Equality, Relative
 from topping_bot.util.const import TMP_PATH
@@ -189,6 +188,7 @@ class Requirements:
                 collapsed[valid] = valid
 
         self.valid = list(collapsed.values())
+        self.compile()
 
         matched = defaultdict(dict)
         for valid in self.valid:
@@ -211,34 +211,48 @@ class Requirements:
                 if bounds.get(substat):
                     bounds[substat]["max"] = min(bounds[substat]["max"], required / Decimal("100"))
 
-    @property
-    @cache
-    def valid_substats(self):
-        return tuple(r.substat for r in self.valid if r.op.str == ">=" and r.substat not in self.objective.types)
+    def compile(self):
+        """
+        Flattens the realized validity into lower and upper bound vectors indexed like SUBSTATS and a zero mask, so a
+        full set is checked in a single pass over the bounded substats
+        """
+        self.lower = [Decimal(0)] * len(SUBSTATS)
+        self.upper = [Decimal("Infinity")] * len(SUBSTATS)
+        for valid in self.valid:
+            bounds = self.lower if valid.op.str == ">=" else self.upper
+            bounds[INDEX[valid.substat]] = valid.target
+
+        self.zero = [upper == 0 for upper in self.upper]
+        self.bounded = [i for i in range(len(SUBSTATS)) if self.lower[i] > 0 or self.upper[i].is_finite()]
+
+        self.floors = [valid for valid in self.valid if valid.op.str == ">="]
+        self.ceilings = [valid for valid in self.valid if valid.op.str == "<=" and valid.target != Decimal(0)]
+        self.zeros = [valid for valid in self.valid if valid.op.str == "<=" and valid.target == Decimal(0)]
+
+        self.valid_substats = tuple(r.substat for r in self.floors if r.substat not in self.objective.types)
+        self.all_substats = tuple(set(self.valid_substats + self.objective.types))
+
+    def violations(self, topping_set: ToppingSet):
+        """Substats of a full set below their floor and above their ceiling"""
+        values = {i: topping_set.value(SUBSTATS[i]) for i in self.bounded}
+        floors = [SUBSTATS[i] for i, value in values.items() if value < self.lower[i]]
+        ceilings = [SUBSTATS[i] for i, value in values.items() if value > self.upper[i]]
+        return floors, ceilings
 
-    @property
-    @cache
-    def all_substats(self):
-        return tuple(set(self.valid_substats + self.objective.types))
+    def satisfied(self, topping_set: ToppingSet):
+        return all(self.lower[i] <= topping_set.value(SUBSTATS[i]) <= self.upper[i] for i in self.bounded)
 
-    @cache
     def floor(self, substat: Type):
-        for req in self.valid:
-            if req.substat == substat and req.op.str == ">=":
-                return req.target
-        return Decimal(0)
+        return self.lower[INDEX[substat]]
 
-    @cache
     def floor_reqs(self):
-        return [valid for valid in self.valid if valid.op.str == ">="]
+        return self.floors
 
-    @cache
     def ceiling_reqs(self):
-        return [valid for valid in self.valid if valid.op.str == "<=" and valid.target != Decimal(0)]
+        return self.ceilings
 
-    @cache
     def zero_reqs(self):
-        return [valid for valid in self.valid if valid.op.str == "<=" and valid.target == Decimal(0)]
+        return self.zeros
 
     def best_possible_set_effect(self, combo: List[Topping], substats: Tuple[Type], non_match_count: int):
         best_set_bonuses = {
@@ -0,0 +1,121 @@
+import json
+from collections import Counter, defaultdict
+from pathlib import Path
+from time import perf_counter
+from types import GeneratorType
+
+from topping_bot.optimize.cutter import Prune
+from topping_bot.util.const import TMP_PATH
+
+STATS_PATH = TMP_PATH / "stats"
+CASES = ("floor_case", "ceiling_case", "objective_case", "combined_case", "special_case")
+
+
+class SolveStats:
+    """
+    Search statistics of a single solve
+
+    Instrumenting wraps the prune, incumbent, bound case and topping cut methods of one optimizer instance, so solves
+    that are not profiled run the plain methods. Case times are inclusive, objective_case holds the floor_case calls
+    it makes. Dropped counts the toppings removed by dominance reduction before the search
+    """
+
+    def __init__(self):
+        self.start = perf_counter()
+        self.nodes = [0] * 6
+        self.prunes = Counter()
+        self.cuts = 0
+        self.dropped = 0
+        self.calls = Counter()
+        self.seconds = defaultdict(float)
+        self.improvements = []
+
+    def instrument(self, optimizer):
+        optimizer.stats = self
+        optimizer.prune = self.counted_prune(optimizer.prune)
+        optimizer.set_incumbent = self.tracked_incumbent(optimizer, optimizer.set_incumbent)
+        for name in CASES:
+            setattr(optimizer, name, self.timed(name, getattr(optimizer, name)))
+
+    def instrument_cutter(self, cutter):
+        cut_topping = cutter.cut_topping
+
+        def counted_cut(*args):
+            if cut := cut_topping(*args):
+                self.cuts += 1
+            return cut
+
+        cutter.cut_topping = counted_cut
+
+    def counted_prune(self, prune):
+        def wrapper(combo, *args):
+            self.nodes[len(combo)] += 1
+            reason = prune(combo, *args)
+            for flag in Prune:
+                if flag is not Prune.NONE and flag in reason[0]:
+                    self.prunes[flag.name] += 1
+            return reason
+
+        return wrapper
+
+    def tracked_incumbent(self, optimizer, set_incumbent):
+        def wrapper(candidate):
+            set_incumbent(candidate)
+            if candidate is not None:
+                value = float(optimizer.reqs.objective.value(candidate))
+                if not self.improvements or value > self.improvements[-1][1]:
+                    self.improvements.append((round(perf_counter() - self.start, 3), value))
+
+        return wrapper
+
+    def timed(self, name: str, case):
+        def wrapper(*args, **kwargs):
+            self.calls[name] += 1
+            start = perf_counter()
+            result = case(*args, **kwargs)
+            self.seconds[name] += perf_counter() - start
+            if isinstance(result, GeneratorType):
+                return self.timed_generator(name, result)
+            return result
+
+        return wrapper
+
+    def timed_generator(self, name: str, generator):
+        while True:
+            start = perf_counter()
+            try:
+                item = next(generator)
+            except StopIteration:
+                self.seconds[name] += perf_counter() - start
+                return
+            self.seconds[name] += perf_counter() - start
+            yield item
+
+    def summary(self):
+        return {
+            "seconds": round(perf_counter() - self.start, 3),
+            "nodes": {depth: count for depth, count in enumerate(self.nodes)},
+            "prunes": dict(self.prunes),
+            "cuts": self.cuts,
+            "dropped": self.dropped,
+            "cases": {name: {"calls": self.calls[name], "seconds": round(self.seconds[name], 3)} for name in CASES},
+            "improvements": self.improvements,
+        }
+
+
+def stats_path(user_id: int) -> Path:
+    STATS_PATH.mkdir(exist_ok=True)
+    return STATS_PATH / f"{user_id}.json"
+
+
+def write_stats(fp: Path, name: str, stats: SolveStats):
+    """Adds a cookie's summary to the stats of the latest !optimize run"""
+    try:
+        with open(fp) as f:
+            summaries = json.load(f)
+    except (OSError, ValueError):
+        summaries = {}
+
+    summaries[name] = stats.summary()
+    with open(fp, "w") as f:
+        json.dump(summaries, f, indent=2)
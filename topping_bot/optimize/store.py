@@ -0,0 +1,113 @@
+from decimal import Decimal
+from hashlib import sha256
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+from topping_bot.optimize.toppings import INDEX, SUBSTATS, Resonance, Topping
+
+MAGIC = b"TPST"
+VERSION = 1
+MAX_SUBSTATS = 4  # flavor and three rolled substats
+RESONANCES = list(Resonance)  # records hold positions, new resonances are appended
+HEADER = np.dtype([("magic", "S4"), ("version", "<u2"), ("count", "<u4"), ("digest", "u1", (32,))])
+RECORD = np.dtype(
+    [
+        ("resonance", "u1"),
+        ("size", "u1"),
+        ("types", "u1", (MAX_SUBSTATS,)),
+        ("digits", "<i4", (MAX_SUBSTATS,)),
+        ("places", "u1", (MAX_SUBSTATS,)),
+    ]
+)
+
+DECIMALS = {}
+
+
+def store_path(fp: Path) -> Path:
+    """Feature store kept next to an inventory csv"""
+    return fp.with_suffix(".bin")
+
+
+def digest(fp: Path) -> bytes:
+    """Content hash of an inventory csv, a store only answers for the csv it was written from"""
+    with open(fp, "rb") as f:
+        return sha256(f.read()).digest()
+
+
+def pack(value: Decimal):
+    """Unscaled digits and decimal places of a substat value, None when it does not fit a record"""
+    if not value.is_finite() or (places := max(-value.as_tuple().exponent, 0)) > 255:
+        return None
+    if not -(2**31) <= (digits := int(value.scaleb(places))) < 2**31:
+        return None
+    return digits, places
+
+
+def unpack(digits: int, places: int):
+    """Substat value with the same digits and exponent as the csv string it was read from"""
+    if (value := DECIMALS.get((digits, places))) is None:
+        value = DECIMALS[(digits, places)] = Decimal(digits).scaleb(-places)
+    return value
+
+
+def write_store(fp: Path, toppings: List[Topping]):
+    """
+    Packs the toppings of the inventory csv at fp into its feature store, one fixed size record per topping
+
+    Toppings that do not fit a record leave the inventory without a store, it is then read from the csv
+    """
+    records = []
+    for topping in toppings:
+        packed = [pack(value) for _, value in topping.substats]
+        if len(packed) > MAX_SUBSTATS or None in packed or topping.resonance is None:
+            store_path(fp).unlink(missing_ok=True)
+            return
+
+        padding = [0] * (MAX_SUBSTATS - len(packed))
+        records.append(
+            (
+                RESONANCES.index(topping.resonance),
+                len(packed),
+                [INDEX[substat] for substat, _ in topping.substats] + padding,
+                [digits for digits, _ in packed] + padding,
+                [places for _, places in packed] + padding,
+            )
+        )
+
+    header = np.array([(MAGIC, VERSION, len(toppings), list(digest(fp)))], dtype=HEADER)
+    records = np.array(records, dtype=RECORD)
+    tmp = fp.with_suffix(".bin.tmp")
+    with open(tmp, "wb") as f:
+        f.write(header.tobytes())
+        f.write(records.tobytes())
+    tmp.replace(store_path(fp))
+
+
+def read_store(fp: Path) -> Optional[List[Topping]]:
+    """Toppings of the inventory csv at fp from its feature store, None if it is missing or stale"""
+    try:
+        header = np.fromfile(store_path(fp), dtype=HEADER, count=1)
+    except (OSError, ValueError):
+        return None
+    if len(header) != 1 or header["magic"][0] != MAGIC or header["version"][0] != VERSION:
+        return None
+    if header["digest"][0].tobytes() != digest(fp):
+        return None
+
+    count = int(header["count"][0])
+    if count == 0:
+        return []
+    if store_path(fp).stat().st_size != HEADER.itemsize + count * RECORD.itemsize:
+        return None
+
+    records = np.memmap(store_path(fp), dtype=RECORD, mode="r", offset=HEADER.itemsize, shape=(count,))
+    columns = zip(*(records[field].tolist() for field in RECORD.names))
+    del records
+
+    toppings = []
+    for i, (resonance, size, types, digits, places) in enumerate(columns):
+        substats = [(SUBSTATS[types[k]], unpack(digits[k], places[k])) for k in range(size)]
+        toppings.append(Topping(substats, resonance=RESONANCES[resonance], index=i))
+    return toppings
@@ -0,0 +1,54 @@
+from collections import defaultdict
+from typing import List, Optional, Tuple
+
+from topping_bot.optimize.cache import objective_fingerprint
+from topping_bot.optimize.requirements import Requirements
+
+
+def covers(ranked: Requirements, reqs: Requirements):
+    """If every set meeting reqs also meets the ranked requirements, both realized and of the same objective"""
+    targets = {(r.substat, r.op.str): r.target for r in ranked.valid}
+    if targets.keys() != {(r.substat, r.op.str) for r in reqs.valid}:
+        return False
+
+    return all(
+        r.target >= targets[(r.substat, r.op.str)] if r.op.str == ">=" else r.target <= targets[(r.substat, r.op.str)]
+        for r in reqs.valid
+    )
+
+
+class CandidateTable:
+    """
+    Ranked topping sets of finished solves, shared by every cookie whose requirements rank sets alike
+
+    A ranking answers requirements with the same objective and the same bounded substats, only tighter. Every set
+    meeting those met the ranked requirements, so filtering the ranking leaves exactly their best sets down to the
+    worst ranked value, a full solve is only needed when fewer than depth sets are left
+
+    Only the team optimizer files rankings. Cookie by cookie solves draw every later cookie from the toppings the
+    earlier ones left over, and the best ranked sets of an earlier cookie all share toppings with the set it took, so
+    a ranking never proves a later cookie there and ranking the earlier solve would only slow it down
+    """
+
+    def __init__(self, depth: int):
+        self.depth = depth
+        self.rankings = defaultdict(list)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, reqs: Requirements, used: frozenset) -> Optional[List[Tuple]]:
+        """Depth best sets of reqs over the toppings not in used, None when no ranking proves them"""
+        for ranked, ranking in self.rankings[(objective_fingerprint(reqs), used)]:
+            if not covers(ranked, reqs):
+                continue
+
+            kept = [(value, candidate) for value, candidate in ranking if reqs.satisfied(candidate)]
+            if len(kept) >= self.depth or len(ranking) < self.depth:  # a short ranking holds every valid set
+                self.hits += 1
+                return kept[: self.depth]
+
+        self.misses += 1
+        return None
+
+    def put(self, reqs: Requirements, used: frozenset, ranking: List[Tuple]):
+        self.rankings[(objective_fingerprint(reqs), used)].append((reqs, ranking))
@@ -0,0 +1,166 @@
+from collections import defaultdict
+from copy import deepcopy
+from typing import Dict, List
+
+from topping_bot.optimize.fixed import FixedOptimizer
+from topping_bot.optimize.requirements import Requirements
+from topping_bot.optimize.table import CandidateTable
+from topping_bot.optimize.toppings import Topping, ToppingSet
+from topping_bot.optimize.validity import Relative
+
+CANDIDATE_DEPTH = 16  # best sets enumerated per cookie
+LEFTOVER_SOLVES = 8  # leftover inventories solved past the first team, later branches only search the shared sets
+SCALE_TOPPINGS = 100  # inventory size past which depth and leftover solves shrink, ranked solves grow costlier
+
+
+class TeamOptimizer:
+    """
+    Optimizes toppings jointly across every cookie of a requirements file
+
+    Each cookie contributes its objective value scaled by its leaderboard weight and by its best value without
+    relative requirements, so cookies of different objectives weigh alike. A branch and bound picks the sets cookie by
+    cookie in file order, trying each cookie's best sets of the toppings left over and pruning with the team-wide
+    bound of every remaining cookie reaching its best set. The first branch is the cookie by cookie solve, so the
+    team never scores worse than it.
+
+    The depth best sets of the full inventory are ranked once and kept in a candidate table, shared by every cookie
+    and branch whose requirements are the same or tighter, the ones disjoint from the toppings already taken are
+    exactly the best sets of the leftover toppings. Only when those run out is the leftover inventory solved again,
+    and once the first team is found at most solves more times, as every leftover solve is a full ranked solve. Depth
+    and solves shrink in proportion past SCALE_TOPPINGS toppings, down to 2 each
+
+    Rankings hold a single set per multiset of identical toppings, a set is taken with whichever copies are left over
+    """
+
+    def __init__(self, toppings: List[Topping], depth: int = CANDIDATE_DEPTH, solves: int = LEFTOVER_SOLVES):
+        self.inventory = toppings
+        self.max_depth, self.max_solves = depth, solves
+        self.depth, self.solves = depth, solves
+        self.resolved = 0
+        self.cookies = []
+        self.scales = {}
+        self.table = CandidateTable(depth)
+        self.copies = {}
+        self.sets = {}
+        self.score = None
+        self.expanded = 0
+
+    def solve(self, cookies: List[Requirements]):
+        """Solves every cookie together, yields while enumerating so the solve can be stopped"""
+        self.cookies = cookies
+        scale = max(len(self.inventory) // SCALE_TOPPINGS, 1)
+        self.depth, self.solves = max(self.max_depth // scale, 2), max(self.max_solves // scale, 2)
+        self.table = CandidateTable(self.depth)
+        self.sets = {}
+        self.score = None
+        self.expanded = 0
+        self.resolved = 0
+
+        self.copies = defaultdict(list)
+        for topping in self.inventory:
+            self.copies[self.signature(topping)].append(topping)
+
+        for i, cookie in enumerate(cookies):  # normalizers, relative requirements only shrink the feasible sets
+            relaxed = deepcopy(cookie)
+            relaxed.valid = [valid for valid in relaxed.valid if not isinstance(valid, Relative)]
+            ranking = yield from self.rank(relaxed, {}, set())
+            if not ranking:  # no set exists even on the full inventory, the cookies ahead of it are solved
+                self.cookies = cookies[:i]
+                break
+            self.scales[cookie.name] = (cookie.weight or 1) / (ranking[0][0] or 1)
+
+        yield from self.search(0, set(), 0, {})
+        if self.score is None:  # every team within the enumerated sets overlaps
+            yield from self.fallback()
+
+    def rank(self, cookie: Requirements, cookie_sets: Dict[str, ToppingSet], used: set):
+        """Depth best sets of a cookie over the toppings not in used, read off the candidate table when it proves them"""
+        cookie = deepcopy(cookie)
+        cookie.realize(cookie_sets)
+
+        if (ranking := self.table.get(cookie, frozenset(used))) is None:
+            optimizer = FixedOptimizer([t for t in self.inventory if id(t) not in used])
+            optimizer.depth = self.depth
+            optimizer.dominators = 5 * len(self.cookies)  # dropped toppings stay swappable across the team
+            yield from optimizer.solve(cookie)
+            ranking = optimizer.ranking()
+            self.resolved += bool(used)
+            self.table.put(cookie, frozenset(used), ranking)
+        return ranking
+
+    def search(self, k: int, used: set, score, chosen: Dict[str, ToppingSet]):
+        """Branch and bound over one set per cookie, in requirements file order"""
+        if k == len(self.cookies):
+            if self.score is None or score > self.score:
+                self.score, self.sets = score, dict(chosen)
+            return
+
+        cookie = self.cookies[k]
+        ranking = yield from self.rank(cookie, chosen, set())
+        disjoint = [(value, claimed) for value, candidate in ranking if (claimed := self.claim(candidate, used))]
+        for value, candidate in disjoint:
+            if not (yield from self.branch(k, used, score, chosen, value, candidate)):
+                return
+
+        if not used or len(ranking) < self.depth or not self.bound(k, score, ranking[-1][0]):
+            return
+        if self.score is not None and self.resolved >= self.solves:  # out of leftover solves
+            return
+
+        # every leftover set past the shared enumeration scores at most its worst set, solve the leftovers
+        taken = [self.multiset(candidate) for _, candidate in disjoint]
+        for value, candidate in (yield from self.rank(cookie, chosen, used)):
+            if self.multiset(candidate) in taken:
+                continue
+            if not (yield from self.branch(k, used, score, chosen, value, candidate)):
+                return
+
+    def branch(self, k: int, used: set, score, chosen: Dict[str, ToppingSet], value, candidate: ToppingSet):
+        """Searches the team with candidate as the set of cookie k, False once the team bound fails"""
+        if not self.bound(k, score, value):
+            return False
+
+        cookie = self.cookies[k]
+        self.expanded += 1
+        chosen[cookie.name] = candidate
+        total = score + value * self.scales[cookie.name]
+        yield from self.search(k + 1, used | set(map(id, candidate.toppings)), total, chosen)
+        chosen.pop(cookie.name)
+        return True
+
+    def bound(self, k: int, score, value):
+        """If cookie k scoring value, and every later cookie its best, could beat the team incumbent"""
+        if self.score is None:
+            return True
+        remaining = sum(cookie.weight or 1 for cookie in self.cookies[k + 1 :])
+        return score + value * self.scales[self.cookies[k].name] + remaining > self.score
+
+    def claim(self, candidate: ToppingSet, used: set):
+        """Candidate made of toppings not in used, swapping in identical copies, None if too few copies are left"""
+        if not any(id(topping) in used for topping in candidate.toppings):
+            return candidate
+
+        claimed, taken = [], set(used)
+        for topping in candidate.toppings:
+            if (copy := next((t for t in self.copies[self.signature(topping)] if id(t) not in taken), None)) is None:
+                return None
+            claimed.append(copy)
+            taken.add(id(copy))
+        return ToppingSet(claimed)
+
+    @staticmethod
+    def signature(topping: Topping):
+        return topping.resonance, tuple(topping.substats)
+
+    def multiset(self, candidate: ToppingSet):
+        return sorted(map(self.signature, candidate.toppings), key=repr)
+
+    def fallback(self):
+        """Cookie by cookie solve, each cookie taking the best set of the toppings left over"""
+        optimizer = FixedOptimizer(self.inventory)
+        self.sets = optimizer.cookies
+        for cookie in self.cookies:
+            yield from optimizer.solve(cookie)
+            if optimizer.solution is None:
+                return
+            optimizer.select(cookie.name)
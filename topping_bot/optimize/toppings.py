@@ -1,8 +1,9 @@
 from decimal import Decimal
 from enum import Enum
-from functools import cache
 from typing import Iterable, List, Tuple, Union
 
+from topping_bot.optimize.memo import MISSING, Memo, solve_memo
+
 
 class Resonance(Enum):
     NORMAL = "Normal"
@@ -151,14 +152,20 @@ INFO = {
     },
 }
 
+SUBSTATS = tuple(INFO)
+INDEX = {substat: i for i, substat in enumerate(SUBSTATS)}
+
 Substats = Union[Type, Tuple[Type]]
 
+TOPPING_VALUES = solve_memo("topping value")
+
 
 class Topping:
     """A single topping"""
 
-    def __init__(self, substats: List[Tuple[str, str]], resonance: Resonance = None):
+    def __init__(self, substats: List[Tuple[str, str]], resonance: Resonance = None, index: int = None):
         self.resonance = resonance
+        self.index = index
         self.flavor = Type(substats[0][0])
         self.substats = [
             (Type(substat), Decimal(value) if value != float("inf") else value) for substat, value in substats
@@ -177,9 +184,17 @@ class Topping:
     def __hash__(self):
         return id(self)
 
-    @cache
     def value(self, substats: Union[Type, Iterable[Type]]):
-        """Value of a topping given a specific substat type"""
+        """Value of a topping given a specific substat type, memoized by inventory index"""
+        if not Memo.active or self.index is None:
+            return self.substat_value(substats)
+
+        key = (self.index, substats)
+        if (value := TOPPING_VALUES.get(key)) is MISSING:
+            value = TOPPING_VALUES.put(key, self.substat_value(substats))
+        return value
+
+    def substat_value(self, substats: Union[Type, Iterable[Type]]):
         substats = substats if type(substats) is tuple else (substats,)
         return sum(value for stat_type, value in self.substats if stat_type in substats)
 
@@ -217,6 +232,13 @@ class ToppingSet:
     def __hash__(self):
         return id(self)
 
+    def key(self):
+        """Inventory indices of the set independent of order, None unless every topping has one"""
+        indices = [topping.index for topping in self.toppings]
+        if None in indices:
+            return None
+        return tuple(sorted(indices))
+
     def raw(self, substat: Type):
         return sum(topping.value(substat) for topping in self.toppings)
 
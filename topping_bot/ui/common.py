@@ -148,6 +148,35 @@ class RequirementConfirm(View):
         await self.cancel()
 
 
+class AcceptBest(View):
+    ctx: Any
+
+    accept_button: Any
+
+    result: bool
+
+    def __init__(self, ctx, *, timeout: int = 1500):
+        super().__init__(timeout=timeout)
+
+        self.ctx = ctx
+        self.result = False
+
+        self.accept_button = Button(label="Accept Current Best", style=ButtonStyle.gray)
+        self.accept_button.callback = self.accept_button_callback
+        self.add_item(self.accept_button)
+
+    async def accept_button_callback(self, interaction: discord.Interaction):
+        if interaction.user != self.ctx.author:
+            embed = await new_embed(
+                title="Hey!", description="This is not your optimization!", color=discord.Colour.red()
+            )
+            return await interaction.response.send_message(embed=embed, ephemeral=True)
+
+        self.result = True
+        self.stop()
+        await interaction.response.defer()
+
+
 @dataclass
 class ThreadSave:
     jump_url: str
@@ -1,9 +1,13 @@
+import os
 import traceback
 from multiprocessing.shared_memory import SharedMemory
 
 from tqdm import tqdm
 
-from topping_bot.optimize.reader import extract_topping_data, extract_unique_frames, write_toppings
+from topping_bot.optimize.memo import solve_scope
+from topping_bot.optimize.stats import SolveStats, write_stats
+from topping_bot.optimize.reader import extract_topping_data, extract_unique_frames, prefetch, write_toppings
+from topping_bot.util.const import CONFIG
 
 
 def full_extraction(fp, topping_fp, shared_mem_name, solution, debug=False, verbose=False):
@@ -18,8 +22,11 @@ def full_extraction(fp, topping_fp, shared_mem_name, solution, debug=False, verb
     byte_pbar = pbar.format_meter(**pbar.format_dict).encode(encoding="utf-8")
     shared_memory.buf[: len(byte_pbar)] = byte_pbar
 
+    # frames are decoded and deduplicated in a background thread while workers read the cards
+    workers = CONFIG["reader"].get("workers") or os.cpu_count()
+    frames = prefetch(extract_unique_frames(fp), CONFIG["reader"].get("frame-queue", 16))
     try:
-        for topping in extract_topping_data(extract_unique_frames(fp), debug=debug, verbose=verbose):
+        for topping in extract_topping_data(frames, debug=debug, verbose=verbose, workers=workers):
             if pbar.update(1):
                 byte_pbar = pbar.format_meter(**pbar.format_dict).encode(encoding="utf-8")
                 shared_memory.buf[: len(byte_pbar)] = byte_pbar
@@ -36,7 +43,28 @@ def full_extraction(fp, topping_fp, shared_mem_name, solution, debug=False, verb
         solution.value = len(toppings)
 
 
-def optimize_cookie(optimizer, cookie, shared_mem_name, solution):
+def publish(solution, best, indices, value: float):
+    """Writes an incumbent for the cog, best holds a sequence number that is odd while the write is underway"""
+    best[0] += 1
+    solution[:] = indices
+    best[1] = value
+    best[0] += 1
+
+
+def read_published(solution, best):
+    """Consistent snapshot of the published incumbent, None before the first one or mid write"""
+    sequence = best[0]
+    indices, value = solution[:], best[1]
+    if sequence == 0 or sequence % 2 or best[0] != sequence:
+        return None
+    return indices, value
+
+
+def inventory_indices(optimizer, toppings):
+    return [next(i for i, t in enumerate(optimizer.inventory) if t is topping) for topping in toppings]
+
+
+def optimize_cookie(optimizer, cookie, shared_mem_name, solution, best, seed=None, stats_fp=None):
     shared_memory = SharedMemory(name=shared_mem_name)
 
     pbar = tqdm(
@@ -49,16 +77,64 @@ def optimize_cookie(optimizer, cookie, shared_mem_name, solution):
     byte_pbar = pbar.format_meter(**pbar.format_dict).encode(encoding="utf-8")
     shared_memory.buf[: len(byte_pbar)] = byte_pbar
 
-    for _ in optimizer.solve(cookie):
-        if shared_memory.buf[-1] == 1:
-            break
-        elif pbar.update(1):
-            byte_pbar = pbar.format_meter(**pbar.format_dict).encode(encoding="utf-8")
-            shared_memory.buf[: len(byte_pbar)] = byte_pbar
+    def listener(candidate):  # stream every improved incumbent to the cog
+        value = float(cookie.objective.value(candidate))
+        if value > best[1]:
+            publish(solution, best, inventory_indices(optimizer, candidate.toppings), value)
+
+    optimizer.listener = listener
+    stats = None
+    if stats_fp is not None and optimizer.profiled:
+        stats = SolveStats()
+        stats.instrument(optimizer)
+
+    seed = [optimizer.inventory[i] for i in seed] if seed else None
+    with solve_scope(cookie.name):
+        solve = optimizer.solve(cookie, seed)
+        for topping in solve:
+            if shared_memory.buf[-1] == 1:
+                break
+            elif topping is not None and pbar.update(1):  # parallel solves yield None on polls between branches
+                byte_pbar = pbar.format_meter(**pbar.format_dict).encode(encoding="utf-8")
+                shared_memory.buf[: len(byte_pbar)] = byte_pbar
+        solve.close()  # finalize the solve, parallel solves merge their branches here
 
     shared_memory.close()
     pbar.close()
 
+    if stats is not None:
+        write_stats(stats_fp, cookie.name, stats)
+
     if optimizer.solution:
-        for i, topping in enumerate(optimizer.solution.toppings):
-            solution[i] = optimizer.inventory.index(topping)
+        value = float(cookie.objective.value(optimizer.solution))
+        publish(solution, best, inventory_indices(optimizer, optimizer.solution.toppings), value)
+
+
+def optimize_team(team, cookies, shared_mem_name, allocation):
+    shared_memory = SharedMemory(name=shared_mem_name)
+
+    pbar = tqdm(
+        mininterval=2,
+        bar_format="{n_fmt} enumerated",
+        leave=False,
+    )
+
+    byte_pbar = pbar.format_meter(**pbar.format_dict).encode(encoding="utf-8")
+    shared_memory.buf[: len(byte_pbar)] = byte_pbar
+
+    with solve_scope("team"):
+        solve = team.solve(cookies)
+        for _ in solve:
+            if shared_memory.buf[-1] == 1:
+                break
+            elif pbar.update(1):
+                byte_pbar = pbar.format_meter(**pbar.format_dict).encode(encoding="utf-8")
+                shared_memory.buf[: len(byte_pbar)] = byte_pbar
+        solve.close()
+
+    shared_memory.close()
+    pbar.close()
+
+    for k, cookie in enumerate(cookies):  # unsolved cookies keep -1 and are solved one by one by the cog
+        if (candidate := team.sets.get(cookie.name)) is not None:
+            allocation[5 * k : 5 * k + 5] = inventory_indices(team, candidate.toppings)
@@ -1,4 +1,7 @@
 import asyncio
 
+from topping_bot.util.const import CONFIG
+
 SEMAPHORE = asyncio.Semaphore(1)
+FAST_SEMAPHORE = asyncio.Semaphore(CONFIG["optimizer"].get("fast-solves", 4))  # --fast solves run beside SEMAPHORE
 RUNNING_CPU_TASK = {}
@@ -1,10 +1,27 @@
+import argparse
 import shutil
+import sys
 
 import numpy as np
 
 from topping_bot.crk.stats import gbhps
+from topping_bot.optimize.benchmark import (
+    CANCEL_GRACE,
+    SIZES,
+    cancel_delay,
+    compare,
+    exact_disagreements,
+    load_baselines,
+    run_benchmark,
+    save_baseline,
+    seed_disagreements,
+)
+from topping_bot.optimize.engines import ENGINES
+from topping_bot.optimize.parallel import POLL_INTERVAL
+from topping_bot.optimize.reader import read_toppings
 from topping_bot.optimize.requirements import sanitize
-from topping_bot.util.const import REQS_PATH, STATIC_PATH
+from topping_bot.optimize.store import read_store, write_store
+from topping_bot.util.const import CONFIG, DATA_PATH, REQS_PATH, STATIC_PATH
 
 
 def req_convert():
@@ -13,6 +30,12 @@ def req_convert():
         shutil.copy(tmp, fp)
 
 
+def store_migrate():
+    for fp in DATA_PATH.glob("*.csv"):
+        if read_store(fp) is None:
+            write_store(fp, read_toppings(fp))
+
+
 def cookie_dump():
     for fp in (STATIC_PATH / "cookies").iterdir():
         if not fp.is_dir():
@@ -29,3 +52,57 @@ def gb_hp_regression():
     lvls = list(range(30, len(gbhps)))
     exp, base = np.exp(np.polyfit(lvls, np.log(adjusted_gbhps), 1))
     print(base, exp)
+
+
+def benchmark():
+    parser = argparse.ArgumentParser(description="Benchmark the optimizer on synthetic inventories")
+    parser.add_argument("--engine", default=CONFIG["optimizer"].get("engine", "decimal"), choices=ENGINES)
+    parser.add_argument("--sizes", type=int, nargs="+")
+    parser.add_argument("--update", action="store_true", help="store the results as the engine baseline")
+    parser.add_argument("--check-seeds", action="store_true", help="check seeded and unseeded solves agree")
+    parser.add_argument("--check-exact", action="store_true", help="check solves against an exhaustive search")
+    parser.add_argument("--check-cancel", action="store_true", help="check parallel solves stop within a poll")
+    args = parser.parse_args()
+    if args.check_exact and args.sizes:
+        parser.error("--sizes cannot be used with --check-exact, the exhaustive search runs on fixed small inventories")
+    sizes = args.sizes or SIZES
+
+    if args.check_cancel:
+        if (delay := cancel_delay()) is None:
+            print("the solve finished before it was cancelled")
+            sys.exit(1)
+        print(f"parallel solve stopped {delay:.2f}s after its cancel")
+        if delay > POLL_INTERVAL + CANCEL_GRACE:
+            sys.exit(1)
+        return
+
+    if args.check_seeds or args.check_exact:
+        if args.check_seeds:
+            disagreements = seed_disagreements(args.engine, sizes)
+        else:
+            disagreements = exact_disagreements(args.engine)
+        for disagreement in disagreements:
+            print(disagreement)
+        if disagreements:
+            sys.exit(1)
+        print("solves agree")
+        return
+
+    results = run_benchmark(args.engine, sizes)
+    for case, cookies in results.items():
+        for name, result in cookies.items():
+            print(f"{case:<16} {name:<12} {result['seconds']:>8}s {result['nodes']!s:>8} nodes  {result['value']}")
+
+    if args.update:
+        save_baseline(args.engine, results)
+        return
+
+    if not (baseline := load_baselines().get(args.engine)):
+        print(f"no {args.engine} baseline stored, run with --update to record one")
+        return
+
+    regressions = compare(results, baseline)
+    for regression in regressions:
+        print(regression)
+    if regressions:
+        sys.exit(1)